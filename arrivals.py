@@ -0,0 +1,376 @@
+import itertools
+import math
+
+import numpy
+
+ORIGIN_IS_0 = 0.5  # of all riders start at floor 0, the rest are spread evenly between the other floors
+DEST_IS_0 = 0.8  # of riders not starting at floor 0 go to floor 0, the rest spread evenly between the others
+
+
+def origin_probabilities(num_floors, origin_is_0=ORIGIN_IS_0):
+    return numpy.array([origin_is_0] + (num_floors - 1) * [(1 - origin_is_0) / (num_floors - 1)])
+
+
+def destination_probabilities(num_floors, origin, dest_is_0=DEST_IS_0):
+    ''' riders from floor 0 go up to any floor, other riders most probably go to 0, never to their origin '''
+    if origin == 0:
+        return numpy.array([0] + (num_floors - 1) * [1 / (num_floors - 1)])
+    if num_floors == 2:
+        return numpy.array([1.0, 0.0])
+    dest_prob = numpy.array([dest_is_0] + (num_floors - 1) * [(1 - dest_is_0) / (num_floors - 2)])
+    dest_prob[origin] = 0
+    return dest_prob
+
+
+def draw_destinations(rng, num_floors, origins, dest_is_0=DEST_IS_0):
+    ''' destinations of riders from origins, as destination_probabilities. dest_is_0 may be one per rider '''
+    size = len(origins)
+    # from floor 0: any floor above. otherwise: floor 0, or one of the floors above that is not the origin
+    up_dests = rng.integers(1, num_floors, size)
+    to_0 = rng.random(size) < dest_is_0
+    others = rng.integers(1, max(num_floors - 1, 2), size)
+    others += others >= origins
+    down_dests = numpy.where(to_0 | (num_floors == 2), 0, others)
+    return numpy.where(origins == 0, up_dests, down_dests)
+
+
+class ArrivalStream:
+    ''' stream of (spawn_time, origin, dest) riders with poisson distributed gaps between them
+    modes:
+    "chunked" - gaps, origins and destinations are drawn chunk_size riders per numpy call. same distribution
+    as "exact", different sequence
+    "exact" - one rider is drawn at a time in the order the model always used (first gap, then per rider its
+    origin, destination and the gap to the next rider), so a fixed seed gives the same riders as before '''
+
+    def __init__(self, num_floors, rng, mean_gap, mode="chunked", chunk_size=4096, start_time=0):
+        if mode not in ("chunked", "exact"):
+            raise ValueError(f"unknown arrival mode {mode}")
+        self.num_floors = num_floors
+        self.rng = rng
+        self.mean_gap = mean_gap
+        self.mode = mode
+        self.chunk_size = chunk_size
+
+        self._origin_prob = origin_probabilities(num_floors)
+        self._dest_prob = [destination_probabilities(num_floors, origin) for origin in range(num_floors)]
+
+        # drawn riders not handed out yet
+        self._times = numpy.empty(0)
+        self._origins = numpy.empty(0, dtype=int)
+        self._dests = numpy.empty(0, dtype=int)
+        self._next = 0
+
+        if self.mode == "exact":
+            self.next_time = start_time + self.rng.poisson(self.mean_gap)
+        else:
+            self._last_time = start_time
+            self._draw_chunk()
+            self.next_time = float(self._times[0])
+
+    def __iter__(self):
+        while True:
+            yield self.pop()
+
+    def pop(self):
+        ''' hand out the next rider and advance next_time '''
+        if self.mode == "exact":
+            spawn_time = self.next_time
+            origin = int(self.rng.choice(self.num_floors, p=self._origin_prob))
+            if origin == 0:
+                dest = int(self.rng.integers(1, self.num_floors))
+            else:
+                dest = int(self.rng.choice(self.num_floors, p=self._dest_prob[origin]))
+            self.next_time = spawn_time + self.rng.poisson(self.mean_gap)
+            return spawn_time, origin, dest
+
+        rider = float(self._times[self._next]), int(self._origins[self._next]), int(self._dests[self._next])
+        self._next += 1
+        if self._next == len(self._times):
+            self._draw_chunk()
+        self.next_time = float(self._times[self._next])
+        return rider
+
+    def _draw_chunk(self):
+        size = self.chunk_size
+        num_floors = self.num_floors
+        gaps = self.rng.poisson(self.mean_gap, size)
+        times = self._last_time + numpy.cumsum(gaps, dtype=float)
+        self._last_time = times[-1]
+
+        origins = self.rng.choice(num_floors, size=size, p=self._origin_prob)
+        dests = draw_destinations(self.rng, num_floors, origins)
+
+        self._times, self._origins, self._dests = times, origins, dests
+        self._next = 0
+
+
+
+class ArrivalProfile:
+    ''' arrival rate over a day, repeating every period seconds. knots are (time in seconds, riders per hour,
+    origin_is_0, dest_is_0) sorted by time, the first at 0. the traffic mix (share of riders starting at floor 0,
+    and of the others going to floor 0) holds from a knot to the next, the rate either holds too ("step") or
+    goes linearly to the rate of the next knot ("linear") '''
+
+    def __init__(self, knots, period=86400, interpolation="step"):
+        if interpolation not in ("step", "linear"):
+            raise ValueError(f"unknown interpolation {interpolation}")
+        if not knots or knots[0][0] != 0:
+            raise ValueError("the first knot of a profile is at time 0")
+        self.knots = [tuple(knot) for knot in knots]
+        self.period = period
+        self.interpolation = interpolation
+        self.times = numpy.array([knot[0] for knot in knots] + [period], dtype=float)
+        rates = numpy.array([knot[1] for knot in knots], dtype=float) / 3600  # riders per second
+        end_rates = numpy.roll(rates, -1) if interpolation == "linear" else rates
+        self.start_rates, self.end_rates = rates, end_rates
+
+    def scaled(self, factor):
+        return ArrivalProfile([(time, rate * factor, *mix) for time, rate, *mix in self.knots], self.period,
+                              self.interpolation)
+
+    def rate(self, time):
+        ''' riders per hour at time '''
+        segment, fraction = self._locate(numpy.asarray(time, dtype=float))
+        return 3600 * (self.start_rates[segment] + fraction * (self.end_rates[segment] - self.start_rates[segment]))
+
+    def _locate(self, time):
+        phase = time % self.period
+        segment = numpy.searchsorted(self.times, phase, side="right") - 1
+        fraction = (phase - self.times[segment]) / (self.times[segment + 1] - self.times[segment])
+        return segment, fraction
+
+
+def office_profile(peak_per_hour=600):
+    ''' a working day: up peak in the morning, lunch in both directions, down peak in the evening '''
+    hour = 3600
+    return ArrivalProfile([
+        (0, 0.05 * peak_per_hour, 0.5, 0.8),
+        (7 * hour, 0.3 * peak_per_hour, 0.9, 0.5),
+        (8 * hour, peak_per_hour, 0.95, 0.5),  # up peak
+        (9.5 * hour, 0.25 * peak_per_hour, 0.2, 0.3),  # interfloor
+        (12 * hour, 0.7 * peak_per_hour, 0.45, 0.7),  # lunch
+        (13.5 * hour, 0.25 * peak_per_hour, 0.2, 0.3),
+        (16.5 * hour, peak_per_hour, 0.05, 0.95),  # down peak
+        (18.5 * hour, 0.1 * peak_per_hour, 0.3, 0.9),
+    ])
+
+
+# arrival profiles by name, functions of the peak rate in riders per hour
+PROFILES = {
+    "office": office_profile,
+}
+
+
+class ProfileArrivals:
+    ''' stream of riders of a time varying ArrivalProfile (a non homogeneous poisson process), with the interface
+    of ArrivalStream. riders are drawn one profile segment at a time, at most max_span seconds long: a poisson
+    number of uniform times at the highest rate of the segment, thinned to the rate at each time. with step
+    profiles nothing is thinned, so the cost follows the number of riders, not the peaks. gaps are exponential,
+    not the poisson distributed whole seconds of ArrivalStream '''
+
+    mode = "profile"
+
+    def __init__(self, num_floors, rng, profile, start_time=0, max_span=900):
+        self.num_floors = num_floors
+        self.rng = rng
+        self.profile = profile
+        self.max_span = max_span
+        self._origin_prob = [origin_probabilities(num_floors, knot[2]) for knot in profile.knots]
+        self._dest_is_0 = numpy.array([knot[3] for knot in profile.knots])
+
+        if not (profile.start_rates > 0).any():
+            raise ValueError("the profile never has riders")
+
+        # the span to draw next starts at _span_start, in segment _segment of period _period. both are only
+        # stepped forward, float phases are not located again
+        self._period, phase = divmod(start_time, profile.period)
+        self._segment = int(numpy.searchsorted(profile.times, phase, side="right")) - 1
+        self._span_start = start_time
+        self._times = numpy.empty(0)
+        self._next = 0
+        while self._next == len(self._times):
+            self._draw_span()
+        self.next_time = float(self._times[0])
+
+    def __iter__(self):
+        while True:
+            yield self.pop()
+
+    def pop(self):
+        ''' hand out the next rider and advance next_time '''
+        rider = float(self._times[self._next]), int(self._origins[self._next]), int(self._dests[self._next])
+        self._next += 1
+        while self._next == len(self._times):
+            self._draw_span()
+        self.next_time = float(self._times[self._next])
+        return rider
+
+    def _draw_span(self):
+        # from _span_start to the end of its segment, or max_span seconds
+        profile = self.profile
+        segment = self._segment
+        start = self._span_start
+        period_start = self._period * profile.period
+        segment_end = period_start + profile.times[segment + 1]
+        start_rate, end_rate = profile.start_rates[segment], profile.end_rates[segment]
+        end = min(segment_end, start + self.max_span)
+        empty = end <= start or (start_rate <= 0 and end_rate <= 0)
+        if empty:
+            end = segment_end  # nobody comes in the rest of this segment
+        if end >= segment_end:
+            self._segment += 1
+            if self._segment == len(profile.knots):
+                self._segment = 0
+                self._period += 1
+        self._span_start = max(end, start)
+        self._times = numpy.empty(0)
+        self._next = 0
+        if empty:
+            return
+
+        # rates at both ends, the end taken within this segment, not at the next knot
+        fractions = (numpy.array([start, end]) - period_start - profile.times[segment]) / (
+            profile.times[segment + 1] - profile.times[segment])
+        rates = start_rate + fractions * (end_rate - start_rate)
+        bound = rates.max()
+        count = self.rng.poisson(bound * (end - start))
+        times = numpy.sort(self.rng.uniform(start, end, count))
+        if profile.interpolation == "linear" and count:
+            rate = rates[0] + (times - start) / (end - start) * (rates[1] - rates[0])
+            times = times[self.rng.random(count) * bound < rate]
+
+        origins = self.rng.choice(self.num_floors, size=len(times), p=self._origin_prob[segment])
+        self._times = times
+        self._origins = origins
+        self._dests = draw_destinations(self.rng, self.num_floors, origins, self._dest_is_0[segment])
+
+
+LOG_DTYPE = numpy.dtype([("time", numpy.float64), ("origin", numpy.uint16), ("dest", numpy.uint16)])
+
+
+def parse_log_lines(lines):
+    ''' (times, origins, dests) arrays of "time,origin,dest" lines, given as bytes. blank lines are skipped '''
+    rows = [line.split(b",") for line in lines if line.strip()]
+    return (numpy.array([float(row[0]) for row in rows]),
+            numpy.array([int(row[1]) for row in rows], dtype=int),
+            numpy.array([int(row[2]) for row in rows], dtype=int))
+
+
+def skip_header(log_file):
+    ''' move a csv log opened in binary mode past its header line, if it has one '''
+    start = log_file.tell()
+    try:
+        float(log_file.readline().split(b",")[0])
+        log_file.seek(start)
+    except ValueError:
+        pass
+
+
+class LogArrivals:
+    ''' riders replayed from a traffic log of (time, origin, dest) rows sorted by time, with the interface of
+    ArrivalStream. a ".csv" log is read as text lines "time,origin,dest" after an optional header, any other
+    file is taken as raw LOG_DTYPE records and memory mapped (see write_log and convert_log). only chunk_size
+    rows are held at a time. model time is log time + time_offset, by default the first rider comes at time 0 '''
+
+    mode = "log"
+
+    def __init__(self, path, num_floors, time_offset=None, chunk_size=65536):
+        self.path = path
+        self.num_floors = num_floors
+        self.chunk_size = chunk_size
+        self.text = path.endswith(".csv")
+        self._open()
+        self._read_chunk(self._file.tell() if self.text else 0)
+        if time_offset is None:
+            time_offset = -float(self._times[0]) if len(self._times) else 0.0
+        self.time_offset = time_offset
+        self._update_next_time()
+
+    def _open(self):
+        if self.text:
+            self._file = open(self.path, "rb")  # binary, so tell() gives offsets to resume from
+            skip_header(self._file)
+        else:
+            self._file = numpy.memmap(self.path, dtype=LOG_DTYPE, mode="r")
+
+    def _read_chunk(self, start):
+        # start and end are byte offsets in csv logs, rows in binary logs
+        self._chunk_start = start
+        if self.text:
+            self._file.seek(start)
+            self._times, self._origins, self._dests = parse_log_lines(
+                itertools.islice(self._file, self.chunk_size))
+            self._chunk_end = self._file.tell()
+        else:
+            chunk = self._file[start:start + self.chunk_size]
+            self._times = chunk["time"].astype(float)
+            self._origins = chunk["origin"].astype(int)
+            self._dests = chunk["dest"].astype(int)
+            self._chunk_end = start + len(chunk)
+        self._next = 0
+
+        bad = ((self._origins < 0) | (self._origins >= self.num_floors) | (self._dests < 0)
+               | (self._dests >= self.num_floors) | (self._origins == self._dests))
+        if bad.any():
+            row = int(numpy.argmax(bad))
+            raise ValueError(f"{self.path}: rider from {self._origins[row]} to {self._dests[row]} does not fit a "
+                             f"building of {self.num_floors} floors")
+        if numpy.any(numpy.diff(self._times) < 0):
+            raise ValueError(f"{self.path}: times are not sorted")
+
+    def _update_next_time(self):
+        if self._next == len(self._times):
+            self.next_time = math.inf
+        else:
+            self.next_time = float(self._times[self._next]) + self.time_offset
+
+    def __iter__(self):
+        while self.next_time < math.inf:
+            yield self.pop()
+
+    def pop(self):
+        ''' hand out the next rider and advance next_time, which is inf after the last rider of the log '''
+        if self.next_time == math.inf:
+            raise IndexError("no riders left in the arrival log")
+        rider = self.next_time, int(self._origins[self._next]), int(self._dests[self._next])
+        self._next += 1
+        if self._next == len(self._times):
+            last_time = self._times[-1]
+            self._read_chunk(self._chunk_end)
+            if len(self._times) and self._times[0] < last_time:
+                raise ValueError(f"{self.path}: times are not sorted")
+        self._update_next_time()
+        return rider
+
+    def __getstate__(self):
+        # checkpoints keep where to continue reading, not the log
+        state = self.__dict__.copy()
+        for name in ("_file", "_times", "_origins", "_dests"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        next_rider = self._next
+        self._open()
+        self._read_chunk(self._chunk_start)
+        self._next = next_rider
+
+
+def write_log(path, times, origins, dests):
+    ''' append riders to a binary log for LogArrivals '''
+    log = numpy.empty(len(times), dtype=LOG_DTYPE)
+    log["time"], log["origin"], log["dest"] = times, origins, dests
+    with open(path, "ab") as log_file:
+        log.tofile(log_file)
+
+
+def convert_log(csv_path, path, chunk_size=1 << 20):
+    ''' binary log from a csv log, converted chunk_size rows at a time '''
+    with open(csv_path, "rb") as csv_file:
+        skip_header(csv_file)
+        while True:
+            times, origins, dests = parse_log_lines(itertools.islice(csv_file, chunk_size))
+            if not len(times):
+                break
+            write_log(path, times, origins, dests)
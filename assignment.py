@@ -0,0 +1,191 @@
+import time
+
+import numpy
+
+from elevator_model import Collective, Direction, lowest_bit
+
+
+def hungarian(cost, column_potential=None, column_of=None, deadline=None, max_steps=None):
+    ''' minimum cost assignment of each row of cost to a distinct column (rows <= columns), by the Hungarian
+    method with shortest augmenting paths. unmatched rows are added one by one, each search step is one numpy
+    pass over the columns. column_potential and column_of, from the solve of a similar matrix, are a warm start:
+    a row keeps its column if the edge can still be made tight once the potentials are feasible for this cost,
+    only the other rows are searched. stops early when deadline (a perf_counter time) passes or after max_steps
+    search steps, the rows matched so far being kept. returns the column of each row, -1 when unmatched, and the
+    column potentials to start the next solve from '''
+    num_rows, num_cols = cost.shape
+    row_potential = numpy.zeros(num_rows)
+    col_potential = numpy.zeros(num_cols) if column_potential is None else numpy.minimum(column_potential, 0)
+    column_of = numpy.full(num_rows, -1) if column_of is None else numpy.array(column_of, dtype=int)
+    row_of = numpy.full(num_cols, -1)  # row matched to each column, -1 when free
+    matched = numpy.flatnonzero(column_of >= 0)
+    row_of[column_of[matched]] = matched
+
+    while True:
+        # free columns have potential 0, rows the highest feasible one
+        col_potential[row_of < 0] = 0
+        row_potential = (cost - col_potential).min(axis=1)
+        rows = numpy.flatnonzero(column_of >= 0)
+        columns = column_of[rows]
+        # a matched edge that is not tight is made so by raising the potential of its column, when that keeps
+        # the column feasible for the other rows. the others are dropped, which frees their columns in turn
+        tight = cost[rows, columns] - row_potential[rows]
+        feasible = (cost[:, columns] - row_potential[:, None]).min(axis=0)
+        repair = (tight > col_potential[columns]) & (tight <= feasible) & (tight <= 0)
+        col_potential[columns[repair]] = tight[repair]
+        loose = tight > col_potential[columns]
+        if not loose.any():
+            break
+        row_of[columns[loose]] = -1
+        column_of[rows[loose]] = -1
+
+    steps = 0
+    way = numpy.zeros(num_cols, dtype=int)  # row the shortest path comes to each column from
+    for row in numpy.flatnonzero(column_of < 0):
+        distance = numpy.full(num_cols, numpy.inf)
+        scanned = numpy.zeros(num_cols, dtype=bool)
+        current, shortest, sink = row, 0.0, -1
+        while sink < 0:
+            if (max_steps is not None and steps >= max_steps
+                    or deadline is not None and time.perf_counter() > deadline):
+                # potentials are only moved once a path is found, they are still feasible and tight
+                return column_of, col_potential
+            steps += 1
+            reduced = cost[current] - row_potential[current] - col_potential + shortest
+            shorter = ~scanned & (reduced < distance)
+            distance[shorter] = reduced[shorter]
+            way[shorter] = current
+            column = int(numpy.argmin(numpy.where(scanned, numpy.inf, distance)))
+            shortest = distance[column]
+            scanned[column] = True
+            if row_of[column] < 0:
+                sink = column
+            else:
+                current = row_of[column]
+
+        row_potential[row] += shortest
+        scanned[sink] = False
+        columns = numpy.flatnonzero(scanned)
+        row_potential[row_of[columns]] += shortest - distance[columns]
+        col_potential[columns] -= shortest - distance[columns]
+        column = sink
+        while True:  # flip the path
+            current = way[column]
+            row_of[column] = current
+            column, column_of[current] = column_of[current], column
+            if current == row:
+                break
+
+    return column_of, col_potential
+
+
+class OptimalDispatch(Collective):
+    ''' collective control where all pending hall calls are reassigned together, as a minimum cost matching of
+    calls to elevator slots solved by hungarian(). an elevator has up to slots_per_elevator slots, its k-th costs
+    k extra stops, so calls spread over the elevators. the matching is solved again when calls come or go, and
+    every resolve_every updates, starting from the matching and potentials of the last solve, so mostly only the
+    new calls are searched. moving a call to another elevator costs switch_time. a solve gets step_budget search
+    steps and time_budget seconds of wall time per update, calls it did not match keep their elevator and new
+    ones are assigned greedily like in Collective, the next update carries on. runs are only reproducible with
+    time_budget None, batch.make_model sets it so '''
+
+    slots_per_elevator = 4
+    resolve_every = 10  # updates
+    step_budget = 1000  # search steps of hungarian() per update, None for no limit
+    time_budget = 0.002  # seconds of wall time per update, None for no limit
+    stop_time = None  # seconds an extra stop costs, default the slow approach to a floor
+    switch_time = 5.0  # seconds, keeps calls from going back and forth between elevators
+
+    def __init__(self, elevators, loads=None):
+        super().__init__(elevators, loads)
+        self._calls = None  # calls of the last solve
+        self._matched = {}  # call -> (elevator, slot) it was matched to by the last solve
+        self._potential = numpy.zeros((self.num_elevators, self.slots_per_elevator))  # of each slot's column
+        self._complete = True  # the last solve matched every call
+        self._updates = 0
+        self.solves = 0
+        self.fallbacks = 0  # solves that ran out of budget
+        self.time_to_floor = numpy.array([elevator.time_to_floor for elevator in elevators], dtype=float)
+        if self.stop_time is None:
+            self.stop_time = elevators[0].time_to_floor_slow
+
+    def candidates(self):
+        # full elevators take no calls
+        return [idx for idx, elevator in enumerate(self.elevators)
+                if self.loads is None or len(self.loads[idx]) < elevator.capacity]
+
+    def cost_matrix(self, calls, candidates, slots):
+        ''' seconds before each slot of the candidate elevators gets to each call, a row per call and the slots
+        of each candidate side by side. travel is the floors of Collective._cost, for all of them at once '''
+        floor = numpy.array([floor for floor, _ in calls], dtype=float)[:, None]
+        call_up = numpy.array([direction == Direction.UP for _, direction in calls])[:, None]
+        assigned = numpy.array([self.hall_calls.assigned_to(*call) for call in calls], dtype=float)[:, None]
+        everything = [self.car_calls[idx] | self.hall_up[idx] | self.hall_down[idx] for idx in candidates]
+        position = numpy.array([self.elevators[idx].floor for idx in candidates], dtype=float)
+        highest = numpy.array([stops.bit_length() - 1 for stops in everything], dtype=float)
+        lowest = numpy.array([lowest_bit(stops) if stops else numpy.inf for stops in everything])
+        idle = numpy.array([not stops and self.elevators[idx].goal is None
+                            for stops, idx in zip(everything, candidates)])
+        sweep_up = numpy.array([self.sweep[idx] == Direction.UP for idx in candidates])
+
+        top = numpy.maximum(numpy.maximum(highest, floor), position)
+        bottom = numpy.minimum(numpy.minimum(lowest, floor), position)
+        sweeping_up = numpy.where(call_up & (floor >= position), floor - position,
+                                  numpy.where(call_up, (top - position) + (top - bottom) + (floor - bottom),
+                                              (top - position) + (top - floor)))
+        sweeping_down = numpy.where(~call_up & (floor <= position), position - floor,
+                                    numpy.where(call_up, (position - bottom) + (floor - bottom),
+                                                (position - bottom) + (top - bottom) + (top - floor)))
+        travel = numpy.where(idle, numpy.abs(position - floor), numpy.where(sweep_up, sweeping_up, sweeping_down))
+        travel *= self.time_to_floor[candidates]
+        # unassigned calls are nan, moving them costs nothing
+        travel += numpy.where((assigned == candidates) | numpy.isnan(assigned), 0, self.switch_time)
+        cost = travel[:, :, None] + numpy.arange(slots) * self.stop_time
+        return cost.reshape(len(calls), len(candidates) * slots)
+
+    def assign_elevator(self):
+        deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        calls = list(self.hall_calls)
+        self._updates += 1
+        if not calls or (calls == self._calls and self._complete and self._updates < self.resolve_every):
+            return
+        self._updates = 0
+        self._calls = calls
+
+        candidates = self.candidates()
+        if candidates:
+            slots = min(self.slots_per_elevator, len(calls))
+            calls = calls[:len(candidates) * slots]  # oldest first, the rest greedily
+            elevator_of = numpy.repeat(candidates, slots)
+            slot_of = numpy.tile(numpy.arange(slots), len(candidates))
+            first_column = {idx: position * slots for position, idx in enumerate(candidates)}
+            column_of = []  # warm start, the column each call had if it is still there
+            for call in calls:
+                idx, slot = self._matched.get(call, (None, slots))
+                column_of.append(first_column[idx] + slot if idx in first_column and slot < slots else -1)
+            columns, potential = hungarian(self.cost_matrix(calls, candidates, slots),
+                                           self._potential[elevator_of, slot_of], column_of, deadline,
+                                           self.step_budget)
+            self._potential[elevator_of, slot_of] = potential
+            self._matched = {call: (int(elevator_of[column]), int(slot_of[column]))
+                             for call, column in zip(calls, columns) if column >= 0}
+            self._complete = len(self._matched) == len(calls)
+            if self._complete:
+                self.solves += 1
+            else:
+                self.fallbacks += 1
+            for (floor, direction), (idx, _) in self._matched.items():
+                self._move_call(floor, direction, idx)
+        super().assign_elevator()  # calls left unassigned
+
+    def _move_call(self, floor, direction, idx):
+        previous = self.hall_calls.assigned_to(floor, direction)
+        if previous == idx:
+            return
+        if previous is not None:
+            self._clear_hall_bit(previous, floor, direction)
+        self.hall_calls.assign(floor, direction, idx)
+        if direction == Direction.UP:
+            self.hall_up[idx] |= 1 << floor
+        else:
+            self.hall_down[idx] |= 1 << floor
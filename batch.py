@@ -0,0 +1,183 @@
+import argparse
+import time
+
+import checkpoint
+import elevator_model
+from arrivals import PROFILES, LogArrivals, ProfileArrivals
+from recording import Recorder
+from assignment import OptimalDispatch
+from destination import DestinationDispatch
+from elevator_model import ElevatorModel
+from event_engine import EventModel
+from fleet import VectorFleetModel
+from metrics import MEASURES
+from profiling import PhaseProfiler
+from tracing import CATEGORIES, DEBUG, INFO, FileSink, Tracer
+
+CONTROLLERS = {
+    **elevator_model.CONTROLLERS,
+    "destination": DestinationDispatch,
+    "optimal": OptimalDispatch,
+}
+
+ENGINES = {
+    "tick": ElevatorModel,
+    "event": EventModel,
+    "vector": VectorFleetModel,
+}
+
+
+def make_model(num_floors=4, num_elevators=2, capacity=4, rider_per_hour=600, seed=1, controller="fifo",
+               engine="tick", arrival_mode="chunked", time_to_floor=None, arrival_log=None, log_offset=None,
+               arrival_profile=None):
+    ''' with arrival_log, riders come from that log instead of being drawn, see arrivals.LogArrivals. with
+    arrival_profile, riders are drawn at the rate of that daily profile, rider_per_hour being its peak.
+    the optimal controller gets no wall time budget, so results do not depend on the load of the machine '''
+    model = ENGINES[engine](num_floors, num_elevators, capacity=capacity, rider_per_hour=rider_per_hour,
+                            seed=seed, controller=CONTROLLERS[controller], arrival_mode=arrival_mode,
+                            time_to_floor=time_to_floor)
+    if isinstance(model.controller, OptimalDispatch):
+        model.controller.time_budget = None  # its step_budget still bounds a solve
+    if arrival_log is not None:
+        model.set_arrivals(LogArrivals(arrival_log, num_floors, time_offset=log_offset))
+    elif arrival_profile is not None:
+        model.set_arrivals(ProfileArrivals(num_floors, model.rng, PROFILES[arrival_profile](rider_per_hour),
+                                           start_time=model.time))
+    return model
+
+
+def run(model, hours, delta_time=1.0):
+    ''' advance the model by the given number of simulated hours without rendering
+    returns the wall time spent, in seconds '''
+    end_time = model.time + hours * 3600
+    start = time.perf_counter()
+    while model.time < end_time:
+        model.update(delta_time)
+    return time.perf_counter() - start
+
+
+def summarize(model, wall_time, sim_time=None):
+    ''' sim_time is the simulated time wall_time was spent on, by default all of it '''
+    sim_time = model.time if sim_time is None else sim_time
+    waiting = sum(len(queue) for queue in model.queues)
+    riding = sum(len(riders) for riders in model.riders_in_elevator)
+
+    summary = {
+        "sim_time": sim_time,
+        "wall_time": wall_time,
+        "sim_per_wall": sim_time / wall_time if wall_time > 0 else float("inf"),
+        "served": model.metrics.served,
+        "waiting": waiting,
+        "riding": riding,
+    }
+    for measure, values in model.metrics.summary().items():
+        for name, value in values.items():
+            summary[f"{measure}_{name}"] = value
+    return summary
+
+
+def print_summary(summary):
+    print(f"simulated {summary['sim_time'] / 3600:.2f} h in {summary['wall_time']:.2f} s "
+          f"({summary['sim_per_wall']:.0f} sim-seconds per wall-second)")
+    print(f"riders served: {summary['served']}, still waiting: {summary['waiting']}, "
+          f"still riding: {summary['riding']}")
+    for measure in MEASURES:
+        print(f"{measure} time [s]: mean {summary[measure + '_mean']:.1f}, p50 {summary[measure + '_p50']:.1f}, "
+              f"p95 {summary[measure + '_p95']:.1f}, p99 {summary[measure + '_p99']:.1f}, "
+              f"max {summary[measure + '_max']:.1f}")
+
+
+def add_model_arguments(parser):
+    parser.add_argument("--hours", type=float, default=1.0, help="simulated hours to run")
+    parser.add_argument("--floors", type=int, default=4, help="number of floors, including ground floor")
+    parser.add_argument("--elevators", type=int, default=2, help="number of elevators")
+    parser.add_argument("--capacity", type=int, default=4, help="riders per elevator")
+    parser.add_argument("--time-to-floor", type=float, default=None, help="seconds per floor at full speed")
+    parser.add_argument("--rate", type=float, default=600, help="riders per hour")
+    parser.add_argument("--seed", type=int, default=1, help="random generator seed")
+    parser.add_argument("--controller", choices=sorted(CONTROLLERS), default="fifo")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="tick",
+                        help="fixed time step, discrete event, or fixed time step with a vectorized fleet")
+    parser.add_argument("--arrivals", choices=("chunked", "exact"), default="chunked",
+                        help="draw riders in chunks, or one by one in the original seeded sequence")
+    parser.add_argument("--arrival-log", help="csv or binary traffic log to replay instead of drawing riders")
+    parser.add_argument("--log-offset", type=float, default=None,
+                        help="seconds added to log times, default the first rider comes at 0")
+    parser.add_argument("--arrival-profile", choices=sorted(PROFILES), default=None,
+                        help="daily profile of the arrival rate, --rate being its peak")
+    parser.add_argument("--step", type=float, default=1.0, help="simulated seconds per model update")
+
+
+def model_config(args):
+    ''' make_model keyword arguments from the parsed command line, without the seed '''
+    return {
+        "num_floors": args.floors,
+        "num_elevators": args.elevators,
+        "capacity": args.capacity,
+        "rider_per_hour": args.rate,
+        "time_to_floor": args.time_to_floor,
+        "controller": args.controller,
+        "engine": args.engine,
+        "arrival_mode": args.arrivals,
+        "arrival_log": args.arrival_log,
+        "log_offset": args.log_offset,
+        "arrival_profile": args.arrival_profile,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the elevator model headless, as fast as possible")
+    add_model_arguments(parser)
+    parser.add_argument("--trace", help="file to record simulation events to, see tracing.py")
+    parser.add_argument("--trace-text", action="store_true", help="record events as text lines, not binary")
+    parser.add_argument("--trace-level", choices=("debug", "info"), default="info",
+                        help="debug adds every rider and door event")
+    parser.add_argument("--trace-category", action="append", choices=CATEGORIES,
+                        help="only record these categories, may be repeated")
+    parser.add_argument("--record", help="file to record the model state to, see recording.py")
+    parser.add_argument("--record-interval", type=float, default=0.0,
+                        help="simulated seconds between recorded frames, default every step")
+    parser.add_argument("--record-every-event", action="store_true",
+                        help="event engine: record a frame after every event, not after every step")
+    parser.add_argument("--resume", help="checkpoint to continue from, instead of a new model")
+    parser.add_argument("--save-checkpoint", help="file to save the model to at the end of the run")
+    parser.add_argument("--profile", action="store_true", help="report the time spent in each phase of update")
+    parser.add_argument("--profile-json", help="file to dump the phase profile to, implies --profile")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.resume:
+        model = checkpoint.load(args.resume)
+    else:
+        model = make_model(seed=args.seed, **model_config(args))
+    if args.trace:
+        level = DEBUG if args.trace_level == "debug" else INFO
+        model.set_tracer(Tracer(level=level, categories=args.trace_category,
+                                sinks=[FileSink(args.trace, binary=not args.trace_text)]))
+    if args.record_every_event and not isinstance(model, EventModel):
+        raise SystemExit("--record-every-event needs the event engine")
+    if args.record:
+        model.set_recorder(Recorder(args.record, interval=args.record_interval,
+                                    every_event=args.record_every_event))
+    if args.profile or args.profile_json:
+        model.set_profiler(PhaseProfiler())
+    print(model)
+    start_time = model.time
+    wall_time = run(model, args.hours, args.step)
+    if model.tracer is not None:
+        model.tracer.close()
+    if model.recorder is not None:
+        model.recorder.close()
+    if args.save_checkpoint:
+        checkpoint.save(model, args.save_checkpoint)
+    print_summary(summarize(model, wall_time, model.time - start_time))
+    if model.profiler is not None:
+        print(model.profiler.report())
+        if args.profile_json:
+            model.profiler.dump(args.profile_json)
+
+
+if __name__ == '__main__':
+    main()
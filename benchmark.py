@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+from batch import CONTROLLERS, ENGINES, make_model
+from sweep import code_version, expand_grid
+
+# make_model arguments to benchmark, every combination of the values is one case
+MATRICES = {
+    "quick": {
+        "num_floors": [4, 20],
+        "num_elevators": [2, 6],
+        "rider_per_hour": [600],
+        "controller": ["fifo", "collective"],
+    },
+    "full": {
+        "num_floors": [4, 20, 50, 150],
+        "num_elevators": [1, 4, 8, 32],
+        "rider_per_hour": [300, 1200, 4800],
+        "controller": sorted(CONTROLLERS),
+    },
+}
+RENDER_CASES = [
+    {"num_floors": 4, "num_elevators": 2},
+    {"num_floors": 20, "num_elevators": 8},
+]
+
+# metric -> True when higher is better
+METRICS = {
+    "ticks_per_second": True,
+    "sim_per_wall": True,
+    "peak_kib": False,
+    "retained_blocks": False,
+    "churn_kib": False,
+    "frame_ms_mean": False,
+    "frame_ms_p95": False,
+}
+
+
+def case_name(config):
+    return (f"{config['controller']}-{config.get('engine', 'tick')}-f{config['num_floors']}"
+            f"-e{config['num_elevators']}-r{config['rider_per_hour']:g}")
+
+
+def time_updates(config, sim_seconds, delta_time=1.0, warmup=600, repeats=3):
+    ''' best of repeats: updates and simulated seconds per wall second, after warmup simulated seconds '''
+    best = None
+    for _ in range(repeats):
+        model = make_model(**config)
+        while model.time < warmup:
+            model.update(delta_time)
+        ticks = int(sim_seconds / delta_time)
+        start = time.perf_counter()
+        for _ in range(ticks):
+            model.update(delta_time)
+        wall_time = time.perf_counter() - start
+        best = wall_time if best is None else min(best, wall_time)
+    return {"ticks_per_second": ticks / best, "sim_per_wall": sim_seconds / best}
+
+
+def trace_memory(config, sim_seconds, delta_time=1.0):
+    ''' peak traced memory of building and running a model, the net change in the blocks held at the end (cpython
+    does not count every allocation), and the churn: memory an update allocates above what was held before it,
+    on average '''
+    tracemalloc.start()
+    try:
+        start = tracemalloc.take_snapshot()
+        model = make_model(**config)
+        peak = churn = updates = 0
+        while model.time < sim_seconds:
+            before, update_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, update_peak)
+            tracemalloc.reset_peak()
+            model.update(delta_time)
+            churn += tracemalloc.get_traced_memory()[1] - before
+            updates += 1
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        growth = tracemalloc.take_snapshot().compare_to(start, "filename")
+    finally:
+        tracemalloc.stop()
+    return {"peak_kib": peak / 1024, "retained_blocks": sum(stat.count_diff for stat in growth),
+            "churn_kib": churn / max(updates, 1) / 1024}
+
+
+def time_frames(config, frames=200, delta_time=2.0):
+    ''' milliseconds per ElevatorRenderer.render, on the SDL dummy video driver '''
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from visualizer import ElevatorRenderer
+
+    pygame.init()
+    try:
+        model = make_model(**config)
+        renderer = ElevatorRenderer(model)
+        frame_ms = []
+        for _ in range(frames):
+            model.update(delta_time)
+            model_state = model.get_state()
+            start = time.perf_counter()
+            renderer.render(model_state)
+            frame_ms.append((time.perf_counter() - start) * 1e3)
+    finally:
+        pygame.quit()
+    return {"frame_ms_mean": float(numpy.mean(frame_ms)), "frame_ms_p95": float(numpy.percentile(frame_ms, 95))}
+
+
+def run_benchmarks(configs, sim_seconds=1800, repeats=3, memory=True, render_cases=(), log=None):
+    results = {}
+    for config in configs:
+        name = case_name(config)
+        result = time_updates(config, sim_seconds, repeats=repeats)
+        if memory:
+            result.update(trace_memory(config, sim_seconds))
+        results[name] = result
+        if log is not None:
+            print(name, format_result(result), file=log)
+    for config in render_cases:
+        name = f"render-f{config['num_floors']}-e{config['num_elevators']}"
+        try:
+            results[name] = time_frames(config)
+        except ImportError:
+            if log is not None:
+                print(f"{name} skipped, pygame is not installed", file=log)
+            continue
+        if log is not None:
+            print(name, format_result(results[name]), file=log)
+    return results
+
+
+def format_result(result):
+    return ", ".join(f"{metric} {value:.1f}" for metric, value in result.items())
+
+
+def environment():
+    return {"python": platform.python_version(), "numpy": numpy.__version__, "machine": platform.machine(),
+            "platform": platform.platform(), "code": code_version()}
+
+
+def compare(results, baseline, threshold=0.1):
+    ''' (case, metric, baseline value, value, relative change) of every metric worse than the baseline by more
+    than threshold, relative change being positive when worse '''
+    regressions = []
+    for name, result in results.items():
+        for metric, value in result.items():
+            base = baseline.get(name, {}).get(metric)
+            if not base:
+                continue
+            change = (base - value) / base if METRICS[metric] else (value - base) / base
+            if change > threshold:
+                regressions.append((name, metric, base, value, change))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput, memory and frame time benchmarks of the model")
+    parser.add_argument("--matrix", choices=sorted(MATRICES), default="quick", help="benchmark cases to run")
+    parser.add_argument("--engine", choices=sorted(ENGINES), action="append",
+                        help="engines to benchmark, may be repeated, default tick")
+    parser.add_argument("--sim-seconds", type=float, default=1800, help="simulated seconds timed per case")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per case, the best one counts")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs, peak, retained blocks and churn")
+    parser.add_argument("--no-render", action="store_true", help="skip the renderer frame timing")
+    parser.add_argument("--save", help="json file to store the results as a baseline")
+    parser.add_argument("--compare", help="baseline json file to compare the results with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configs = expand_grid({}, {**MATRICES[args.matrix], "engine": args.engine or ["tick"]})
+    results = run_benchmarks(configs, args.sim_seconds, args.repeats, memory=not args.no_memory,
+                             render_cases=() if args.no_render else RENDER_CASES, log=sys.stdout)
+
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump({"environment": environment(), "results": results}, baseline_file, indent=1)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline["results"], args.threshold)
+        for name, metric, base, value, change in regressions:
+            print(f"regression {name} {metric}: {base:.1f} -> {value:.1f} ({change:+.0%})")
+        print(f"{len(regressions)} regressions over {args.threshold:.0%} against {args.compare}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
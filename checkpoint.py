@@ -0,0 +1,73 @@
+import lzma
+import pickle
+
+import numpy
+
+from arrivals import ArrivalStream, LogArrivals, ProfileArrivals
+
+FORMAT = 5  # bumped when checkpoints of older code can no longer be loaded
+
+
+def dumps(model, preset=6):
+    ''' the full state of a model as lzma compressed bytes: time, elevators, queues, riders, controller,
+    arrival stream and the state of its random generator. tracer, profiler, recorder and snapshots are not
+    saved, snapshot versions start over after loading '''
+    tracer, profiler, recorder, snapshots = model.tracer, model.profiler, model.recorder, model.snapshots
+    model.set_tracer(None)
+    model.set_profiler(None)
+    model.set_recorder(None)
+    model.snapshots = None
+    try:
+        data = pickle.dumps({"format": FORMAT, "model": model}, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        model.set_tracer(tracer)
+        model.set_profiler(profiler)
+        model.set_recorder(recorder)
+        model.snapshots = snapshots
+    return lzma.compress(data, preset=preset)
+
+
+def loads(data):
+    checkpoint = pickle.loads(lzma.decompress(data))
+    if checkpoint.get("format") != FORMAT:
+        raise ValueError(f"checkpoint format {checkpoint.get('format')} is not {FORMAT}")
+    return checkpoint["model"]
+
+
+def save(model, path, preset=6):
+    ''' write a checkpoint of model to path, load() continues bit for bit where the model is now,
+    as long as the code did not change '''
+    with open(path, "wb") as checkpoint_file:
+        checkpoint_file.write(dumps(model, preset))
+
+
+def load(path):
+    with open(path, "rb") as checkpoint_file:
+        return loads(checkpoint_file.read())
+
+
+def clone(model):
+    ''' independent copy of model, continuing exactly like it '''
+    return loads(dumps(model, preset=0))
+
+
+def branch(model, seed, rider_per_hour=None):
+    ''' copy of model whose riders from now on are drawn with a new seed, and rate, e.g. scenarios that share
+    a simulated warm up. riders already waiting or riding are kept. a profile keeps its shape, rider_per_hour
+    scales it to that peak. riders replayed from a traffic log are not drawn, those models cannot branch '''
+    if isinstance(model.arrivals, LogArrivals):
+        raise ValueError("riders come from a traffic log, a branch would not differ, use clone() instead")
+    branched = clone(model)
+    branched.rng = numpy.random.default_rng(seed)
+    if isinstance(branched.arrivals, ProfileArrivals):
+        profile = branched.arrivals.profile
+        if rider_per_hour is not None:
+            profile = profile.scaled(rider_per_hour / profile.rate(profile.times[:-1]).max())
+        branched.set_arrivals(ProfileArrivals(branched.num_floors, branched.rng, profile,
+                                              start_time=branched.time))
+        return branched
+    if rider_per_hour is not None:
+        branched.lam = 3600 / rider_per_hour
+    branched.set_arrivals(ArrivalStream(branched.num_floors, branched.rng, branched.lam,
+                                        mode=branched.arrivals.mode, start_time=branched.time))
+    return branched
@@ -1,17 +1,82 @@
+import time
+
 import pygame
 from elevator_model import ElevatorModel
 from visualizer import ElevatorRenderer
 
+FPS = 20  # frames per second, at most
+SIM_STEP = 1.0  # simulated seconds per model update, whatever the speed
+SPEEDS = {pygame.K_1: 1, pygame.K_2: 10, pygame.K_3: 100, pygame.K_4: None}  # simulated per wall second, None = max
+MAX_DROPPED_FRAMES = 10  # render at least every this many frames, even when the simulation is behind
+MAX_LAG = 1.0  # wall seconds of simulation carried over at most, beyond that the model is too slow for the speed
+
+
+class Playback:
+    ''' runs the model at speed simulated seconds per wall second in fixed SIM_STEP updates, as many per frame as
+    that takes, so the speed does not change the result. updates get at most one frame time per frame, what is
+    left is carried over and the next frames are not drawn until the simulation caught up. at max speed every
+    frame is filled with updates '''
+
+    def __init__(self, model, speed=10, step=SIM_STEP, fps=FPS):
+        self.model = model
+        self.speed = speed
+        self.step = step
+        self.frame_time = 1 / fps
+        self.paused = False
+        self.owed = 0.0  # simulated seconds due, not yet run
+        self.dropped = 0  # frames not drawn in a row
+
+    def set_speed(self, speed):
+        self.speed = speed
+        self.owed = 0.0
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+        self.owed = 0.0
+
+    def single_step(self):
+        ''' one update, while paused '''
+        if self.paused:
+            self.model.update(self.step)
+
+    def advance(self, wall_time):
+        ''' run the updates due after wall_time seconds, true when the simulation is caught up '''
+        if self.paused:
+            return True
+        deadline = time.perf_counter() + self.frame_time
+        if self.speed is None:
+            while time.perf_counter() < deadline:
+                self.model.update(self.step)
+            return True
+        self.owed = min(self.owed + wall_time * self.speed, MAX_LAG * self.speed)
+        while self.owed >= self.step and time.perf_counter() < deadline:
+            self.model.update(self.step)
+            self.owed -= self.step
+        return self.owed < self.step
+
+    def should_draw(self, caught_up):
+        if caught_up or self.dropped >= MAX_DROPPED_FRAMES:
+            self.dropped = 0
+            return True
+        self.dropped += 1
+        return False
+
+    def caption(self):
+        speed = "max" if self.speed is None else f"{self.speed}x"
+        state = "paused" if self.paused else speed
+        hours, seconds = divmod(int(self.model.time), 3600)
+        return f"Multiple Elevator System Sim - {hours}:{seconds // 60:02d}:{seconds % 60:02d} - {state}"
+
 
 def main(num_floors, num_elevators):
+    ''' space pauses, s single steps while paused, 1 2 3 4 run at 1x 10x 100x and max speed '''
     pygame.init()
 
     model = ElevatorModel(num_floors, num_elevators)
     renderer = ElevatorRenderer(model)
+    playback = Playback(model)
 
     clock = pygame.time.Clock()
-    FPS = 20  # frames per second
-    ACCELERATION_FACTOR = 40
     running = True
 
     while running:
@@ -19,10 +84,19 @@ def main(num_floors, num_elevators):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    playback.toggle_pause()
+                elif event.key == pygame.K_s:
+                    playback.single_step()
+                elif event.key in SPEEDS:
+                    playback.set_speed(SPEEDS[event.key])
 
-        model.update(ACCELERATION_FACTOR / FPS)
-        model_state = model.get_state()
-        renderer.render(model_state)
+        caught_up = playback.advance(clock.get_time() / 1000)
+        if playback.should_draw(caught_up):
+            model_state = model.get_state()
+            renderer.render(model_state)
+            pygame.display.set_caption(playback.caption())
 
         clock.tick(FPS)
 
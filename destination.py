@@ -0,0 +1,176 @@
+import numpy
+
+from elevator_model import Collective, Direction, State
+from tracing import ASSIGN
+
+
+class DestinationDispatch(Collective):
+    ''' destination dispatch: riders enter their destination at the hall, and are assigned an elevator right
+    away. every elevator is scored at once with numpy on the estimated wait, the ride, and the delay the two
+    extra stops cause the riders it already carries or is going to pick up. elevators then sweep like in
+    Collective, their hall stops being the origins of the riders assigned to them '''
+
+    assigns_riders = True
+    stop_time = None  # seconds an extra stop costs, default the slow approach to a floor
+    delay_weight = 1.0  # weight of the delay caused to other riders
+
+    def __init__(self, elevators, loads):
+        super().__init__(elevators, loads)
+        self.num_floors = len(loads[0].count)
+        self.has_stop = numpy.zeros((self.num_elevators, self.num_floors), dtype=bool)
+        self.pickups = [{} for _ in range(self.num_elevators)]  # (floor, direction) -> riders assigned
+        self.pending = numpy.zeros(self.num_elevators, dtype=int)  # assigned riders not on board yet
+        self.capacity = numpy.array([elevator.capacity for elevator in elevators])
+        self.time_to_floor = numpy.array([elevator.time_to_floor for elevator in elevators], dtype=float)
+        # elevators as costs() sees them. load and going_up follow the doors, the rest is made again by
+        # _refresh when stale: after the elevators moved or were given new goals, or has_stop changed
+        self.load = numpy.array([len(riders) for riders in loads])
+        self.going_up = numpy.array([sweep == Direction.UP for sweep in self.sweep])
+        self.position = numpy.zeros(self.num_elevators)
+        self.busy = numpy.zeros(self.num_elevators, dtype=bool)
+        self._rows = numpy.arange(self.num_elevators)
+        self._stale = True
+        self._stops_stale = True
+        self.parked = numpy.zeros(self.num_elevators, dtype=bool)  # full, hall stops left out, see release
+        if self.stop_time is None:
+            self.stop_time = elevators[0].time_to_floor_slow
+
+    def elevators_moved(self):
+        self._stale = True
+
+    def release(self, idx):
+        # riders keep the elevator they were given, it stops for them again once it has room
+        self.hall_up[idx] = 0
+        self.hall_down[idx] = 0
+        self.parked[idx] = True
+
+    def update(self):
+        for idx in numpy.flatnonzero(self.parked):
+            if not self.full(idx):
+                for floor, direction in self.pickups[idx]:
+                    if direction == Direction.UP:
+                        self.hall_up[idx] |= 1 << floor
+                    else:
+                        self.hall_down[idx] |= 1 << floor
+                self.parked[idx] = False
+        super().update()
+        self._stale = True
+        self.going_up[:] = [sweep == Direction.UP for sweep in self.sweep]
+
+    def _refresh(self):
+        if self._stale:
+            self.position[:] = [elevator.floor for elevator in self.elevators]
+            self.busy[:] = [elevator.goal is not None or elevator.state not in (State.IDLE_CLOSED,
+                                                                                  State.IDLE_OPEN)
+                            for elevator in self.elevators]
+        if self._stops_stale:
+            # stops at or below each floor, and whether there are any
+            self.cumulative = numpy.cumsum(self.has_stop, axis=1)
+            self.any_stop = self.cumulative[:, -1] > 0
+        # extent of each elevator's sweep, without the rider's origin
+        has_stop, position = self.has_stop, self.position
+        top = numpy.where(self.any_stop, self.num_floors - 1 - numpy.argmax(has_stop[:, ::-1], axis=1), position)
+        bottom = numpy.where(self.any_stop, numpy.argmax(has_stop, axis=1), position)
+        self.top = numpy.maximum(top, position)
+        self.bottom = numpy.minimum(bottom, position)
+        self.idle = ~self.busy & ~self.any_stop
+        self._stale = self._stops_stale = False
+
+    def register_call(self, floor, direction):
+        pass  # riders left behind are reassigned one by one in doors_opened
+
+    def assign_elevator(self):
+        pass  # riders are assigned as they arrive
+
+    def rider_arrived(self, rider):
+        self._assign(rider, self.best_elevator(rider.origin, rider.dest))
+
+    def _assign(self, rider, idx):
+        direction = Direction.UP if rider.dest > rider.origin else Direction.DOWN
+        rider.car = idx
+        self.pickups[idx].setdefault((rider.origin, direction), []).append(rider)
+        self.pending[idx] += 1
+        if direction == Direction.UP:
+            self.hall_up[idx] |= 1 << rider.origin
+        else:
+            self.hall_down[idx] |= 1 << rider.origin
+        if not self.has_stop[idx, rider.origin]:
+            self.has_stop[idx, rider.origin] = True
+            self._stops_stale = True
+        if self.tracer is not None:
+            self.tracer.emit(ASSIGN, elevator=idx, floor=rider.origin, rider=rider.id, value=direction.value)
+
+    def request(self, elevator, dest):
+        super().request(elevator, dest)
+        if not self.has_stop[elevator.id, dest]:
+            self.has_stop[elevator.id, dest] = True
+            self._stops_stale = True
+
+    def doors_opened(self, idx, floor, direction):
+        self.car_calls[idx] &= ~(1 << floor)
+        self._clear_hall_bit(idx, floor, direction)
+        stops = self.car_calls[idx] | self.hall_up[idx] | self.hall_down[idx]
+        if self.has_stop[idx, floor] != bool(stops >> floor & 1):
+            self.has_stop[idx, floor] = not self.has_stop[idx, floor]
+            self._stops_stale = True
+        self.sweep[idx] = direction
+        self.going_up[idx] = direction == Direction.UP
+        self.load[idx] = len(self.loads[idx])
+
+        riders = self.pickups[idx].pop((floor, direction), ())
+        self.pending[idx] -= len(riders)
+        left_behind = [rider for rider in riders if rider.board_time is None]
+        for rider in left_behind:
+            costs = self.costs(rider.origin, rider.dest)
+            costs[idx] = numpy.inf  # it did not take them
+            self._assign(rider, int(numpy.argmin(costs)) if numpy.isfinite(costs).any() else idx)
+
+    def best_elevator(self, origin, dest):
+        return int(numpy.argmin(self.costs(origin, dest)))
+
+    def costs(self, origin, dest):
+        ''' estimated cost in seconds of serving a rider from origin to dest, by every elevator '''
+        if self._stale or self._stops_stale:
+            self._refresh()
+        position, going_up, load, has_stop = self.position, self.going_up, self.load, self.has_stop
+        up = dest > origin
+
+        # extent of each elevator's sweep
+        top = numpy.maximum(self.top, origin)
+        bottom = numpy.minimum(self.bottom, origin)
+
+        # floors travelled to the origin along the sweep, idle elevators go straight
+        if up:
+            on_the_way = going_up & (origin >= position)
+            distance = numpy.where(on_the_way, origin - position,
+                                   numpy.where(going_up, (top - position) + (top - bottom) + (origin - bottom),
+                                               (position - bottom) + (origin - bottom)))
+        else:
+            on_the_way = ~going_up & (origin <= position)
+            distance = numpy.where(on_the_way, position - origin,
+                                   numpy.where(going_up, (top - position) + (top - origin),
+                                               (position - bottom) + (top - bottom) + (top - origin)))
+        distance = numpy.where(self.idle, numpy.abs(position - origin), distance)
+
+        # stops already planned between the elevator and the origin, and between origin and destination
+        cumulative, rows = self.cumulative, self._rows
+        # elevators never leave the shaft, rounded positions are floors
+        low = numpy.minimum(position, origin).round().astype(int)
+        high = numpy.maximum(position, origin).round().astype(int)
+        stops_before = cumulative[rows, high] - cumulative[rows, low]
+        ride_low, ride_high = min(origin, dest), max(origin, dest)
+        stops_riding = cumulative[:, ride_high - 1] - cumulative[:, ride_low]
+
+        wait = distance * self.time_to_floor + stops_before * self.stop_time
+        ride = abs(dest - origin) * self.time_to_floor + stops_riding * self.stop_time
+
+        # every rider on board or assigned is held up by each stop that is new
+        occupied = load + self.pending
+        new_stops = 2 - has_stop[:, origin].astype(int) - has_stop[:, dest]
+        delay = occupied * new_stops * self.stop_time
+
+        cost = wait + ride + self.delay_weight * delay
+        full = occupied >= self.capacity
+        if not full.all():
+            cost = numpy.where(full, numpy.inf, cost)
+        return cost
@@ -1,6 +1,14 @@
+from collections import deque
 from enum import Enum
+import itertools
+import math
 import numpy
 
+from arrivals import ArrivalStream
+from metrics import JourneyMetrics
+from snapshot import Snapshots
+from tracing import SPAWN, CALL, ASSIGN, DEPART, ARRIVE, DOOR, BOARD, ALIGHT
+
 class State(Enum):
     IDLE_CLOSED = 0
     IDLE_OPEN = 1
@@ -16,41 +24,94 @@ class Direction(Enum):
 
 
 class ElevatorModel:
-    def __init__(self, num_floors, num_elevators):
+    def __init__(self, num_floors, num_elevators, capacity=4, rider_per_hour=600, seed=1, controller=None,
+                 arrival_mode="chunked", time_to_floor=None, tracer=None):
         self.num_floors = num_floors  # 0 + number of floors above ground
         self.num_elevators = num_elevators
         self.time = 0
 
-        self.elevators = []
-        for elevator in range(self.num_elevators):
-            self.elevators.append(Elevator(elevator))
-
-        self.controller = Fifo(self.elevators)  # Testing(self.elevators)
-        self.queues = [[] for _ in range(self.num_floors)]
-        self.riders_in_elevator = [[] for _ in range(self.num_elevators)]
-        self.riders_served = []
+        self.elevators = self._make_elevators(capacity, time_to_floor)
+
+        self.queues = [FloorQueue(floor, self.num_floors) for floor in range(self.num_floors)]
+        self.riders_in_elevator = [CarLoad(self.num_floors) for _ in range(self.num_elevators)]
+        if controller is None:
+            controller = Fifo  # Testing
+        self.controller = controller(self.elevators, self.riders_in_elevator)
+        self.riders_total = 0  # riders spawned so far, also the id of the next one
+        self.metrics = JourneyMetrics(self.num_floors, self.num_elevators)  # instead of keeping served riders
+        self.tracer = None
+        if tracer is not None:
+            self.set_tracer(tracer)
+        self.profiler = None
+        self.recorder = None
+        self.snapshots = None  # made by the first snapshot()
 
         # random generator
-        seed = 1
-        rider_per_hour = 600
         average_time_between_riders_sec = 3600 / rider_per_hour
         self.rng = numpy.random.default_rng(seed)
         self.lam = average_time_between_riders_sec
-        self.next_rider_spawn_time = self.rng.poisson(self.lam)
+        self.arrivals = ArrivalStream(self.num_floors, self.rng, self.lam, mode=arrival_mode)
+        self.next_rider_spawn_time = self.arrivals.next_time
+
+    def _make_elevators(self, capacity, time_to_floor=None):
+        elevators = [Elevator(elevator, capacity=capacity) for elevator in range(self.num_elevators)]
+        if time_to_floor is not None:
+            for elevator in elevators:
+                elevator.time_to_floor = time_to_floor
+        return elevators
+
+    def set_arrivals(self, arrivals):
+        ''' riders come from arrivals from now on, e.g. a branch with another seed '''
+        self.arrivals = arrivals
+        self.next_rider_spawn_time = arrivals.next_time
+
+    def set_tracer(self, tracer):
+        ''' record events into tracer, None to stop tracing '''
+        self.tracer = tracer
+        if tracer is not None:
+            tracer.clock = lambda: self.time
+        self.controller.set_tracer(tracer)
+        for elevator in self.elevators:
+            elevator.tracer = tracer
+
+    def set_recorder(self, recorder):
+        ''' record the state after every update with recorder, see recording.py. None to stop recording '''
+        self.recorder = recorder
+
+    def set_profiler(self, profiler):
+        ''' time every phase of update with profiler, None to stop profiling '''
+        if self.profiler is not None:
+            self.profiler.detach(self)
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.attach(self)
 
     def __str__(self):
         return f"Building with {self.num_floors} floors and {self.num_elevators} elevators"
 
     def spawn_rider(self):
-        if self.time >= self.next_rider_spawn_time:
-            # spawn a new rider
-            new_rider = Rider(self.num_floors, self.rng, self.time, self.controller)
+        # spawn every rider whose time has come
+        while self.time >= self.arrivals.next_time:
+            spawn_time, origin, dest = self.arrivals.pop()
+            new_rider = Rider(self.riders_total, origin, dest, spawn_time)
+            self.riders_total += 1
+            if self.tracer is not None:
+                self.tracer.emit(SPAWN, floor=new_rider.origin, rider=new_rider.id, value=new_rider.dest)
+            self.controller.rider_arrived(new_rider)  # may assign the rider a car, which the queue needs
             self.queues[new_rider.origin].append(new_rider)
-            # print(f"new rider added to {new_rider.origin} floor")
+        self.next_rider_spawn_time = self.arrivals.next_time
+
+    def snapshot(self):
+        ''' immutable state of the model, see snapshot.Snapshot. its version goes up when the state changes '''
+        if self.snapshots is None:
+            self.snapshots = Snapshots(self)
+        return self.snapshots.take()
 
-            # get time for next rider spawn
-            delta_time = self.rng.poisson(self.lam)
-            self.next_rider_spawn_time = self.time + delta_time
+    def delta(self, since=None):
+        ''' what changed since the snapshot of version since, see snapshot.Delta '''
+        if self.snapshots is None:
+            self.snapshots = Snapshots(self)
+        return self.snapshots.delta(since)
 
     def get_state(self):
         return {
@@ -63,41 +124,168 @@ class ElevatorModel:
         # TODO controller should only set goal to elevator, elevator start to move later by its own decision
         self.time += delta_time
         self.controller.update()
-        for elevator in self.elevators:
-            elevator.update(delta_time)
+        self._step_elevators(delta_time)
+        self.controller.elevators_moved()
         self.spawn_rider()
         self.enter_exit_elevators()
+        if self.recorder is not None:
+            self.recorder.record(self)
+
+    def _step_elevators(self, delta_time):
+        for elevator in self.elevators:
+            elevator.update(delta_time)
+
+    def _open_elevators(self):
+        ''' indices of the elevators with their doors open '''
+        return [idx for idx, elevator in enumerate(self.elevators) if elevator.state == State.IDLE_OPEN]
 
     def enter_exit_elevators(self):
-        for idx, elevator in enumerate(self.elevators):
-            # check if door is open
-            if not elevator.state == State.IDLE_OPEN:
-                continue
+        for idx in self._open_elevators():
+            elevator = self.elevators[idx]
             floor = int(elevator.floor)
 
             # exit if it is your floor
-            for rider in self.riders_in_elevator[idx].copy():
-                if floor == rider.dest:
-                    self.riders_in_elevator[idx].remove(rider)
-                    self.riders_served.append(rider)
-                    # print(f"{rider} arrived at destination")
-
-            # enter if elevator is not full
-            # print(f"before entering: {len(self.riders_in_elevator[idx])} riders in {idx}")
-            # TODO remove prints
-            for rider in self.queues[floor].copy():
-                if len(self.riders_in_elevator[idx]) < elevator.capacity:
-                    rider.enter(elevator)
-                    self.queues[floor].remove(rider)
+            for rider in self.riders_in_elevator[idx].alight(floor):
+                rider.alight_time = self.time
+                self.metrics.alight(rider, idx, self.time)
+                if self.tracer is not None:
+                    self.tracer.emit(ALIGHT, elevator=idx, floor=floor, rider=rider.id)
+
+            # enter if elevator is not full, only riders going the elevator's way
+            queue = self.queues[floor]
+            direction = self._boarding_direction(idx, elevator, queue)
+            if queue:
+                free = elevator.capacity - len(self.riders_in_elevator[idx])
+                car = idx if self.controller.assigns_riders else None
+                for rider in queue.board(direction, free, car):
+                    self.controller.request(elevator, rider.dest)
+                    rider.board_time = self.time
+                    self.metrics.board(rider, idx, self.time)
                     self.riders_in_elevator[idx].append(rider)
-                    print(f"after entering: {len(self.riders_in_elevator[idx])} riders in {idx}")
+                    if self.tracer is not None:
+                        self.tracer.emit(BOARD, elevator=idx, floor=floor, rider=rider.id)
+            self.controller.doors_opened(idx, floor, direction)
+            if self.controller.assigns_riders:
+                queue.follow_assignments(direction, idx)  # riders left behind may have been given another car
+            if queue.waiting(direction):  # elevator is full, the rest call again
+                self.controller.register_call(floor, direction)
+
+            # riders still inside ask again for the nearest destination, so the elevator does not stay idle
+            if elevator.goal is None and self.riders_in_elevator[idx]:
+                nearest = min(self.riders_in_elevator[idx].stops(), key=lambda dest: abs(dest - floor))
+                self.controller.request(elevator, nearest)
+
+    def _boarding_direction(self, idx, elevator, queue):
+        # the controller decides if it plans the elevator's way,
+        # otherwise riders already inside decide, and an empty elevator takes whoever waited longest
+        direction = self.controller.boarding_direction(idx, queue.floor)
+        if direction is not None:
+            return direction
+        up = self.riders_in_elevator[idx].any_above(queue.floor)
+        down = self.riders_in_elevator[idx].any_below(queue.floor)
+        if up != down:
+            return Direction.UP if up else Direction.DOWN
+        if up and down:
+            return elevator._direction
+        if not queue.down:
+            return Direction.UP
+        if not queue.up:
+            return Direction.DOWN
+        return Direction.UP if queue.up[0].spawn_time <= queue.down[0].spawn_time else Direction.DOWN
+
+
+class HallCalls:
+    ''' pending hall calls, at most one up and one down per floor, in the order they were made.
+    each call is either unassigned or assigned to one elevator '''
+
+    def __init__(self):
+        self.calls = {}  # (floor, Direction) -> assigned elevator id, or None
+        self._by_elevator = {}  # elevator id -> calls assigned to it
+        self.tracer = None
+
+    def __len__(self):
+        return len(self.calls)
+
+    def __contains__(self, call):
+        return call in self.calls
+
+    def __iter__(self):
+        return iter(self.calls)
+
+    def register(self, floor, direction):
+        if (floor, direction) in self.calls:
+            return
+        self.calls[(floor, direction)] = None
+        if self.tracer is not None:
+            self.tracer.emit(CALL, floor=floor, value=direction.value)
+
+    def clear(self, floor, direction):
+        elevator_id = self.calls.pop((floor, direction), None)
+        if elevator_id is not None:
+            self._by_elevator[elevator_id].discard((floor, direction))
+
+    def assign(self, floor, direction, elevator_id):
+        previous = self.calls.get((floor, direction))
+        if previous is not None:
+            self._by_elevator[previous].discard((floor, direction))
+        self.calls[(floor, direction)] = elevator_id
+        self._by_elevator.setdefault(elevator_id, set()).add((floor, direction))
+        if self.tracer is not None:
+            self.tracer.emit(ASSIGN, elevator=elevator_id, floor=floor, value=direction.value)
+
+    def assigned_to(self, floor, direction):
+        return self.calls.get((floor, direction))
+
+    def unassigned(self):
+        return [call for call, elevator_id in self.calls.items() if elevator_id is None]
+
+    def release(self, elevator_id):
+        ''' unassign every call assigned to the elevator '''
+        for call in self._by_elevator.pop(elevator_id, ()):
+            self.calls[call] = None
+
 
 class Controller:
 
-    def __init__(self, elevators):
+    assigns_riders = False  # riders board only the elevator in rider.car
+    tracer = None
+
+    def __init__(self, elevators, loads=None):
         self.num_elevators = len(elevators)
         self.elevators = elevators
-        self.requests = []
+        self.loads = loads  # CarLoad of each elevator, when run by ElevatorModel
+        self.hall_calls = HallCalls()
+
+    def set_tracer(self, tracer):
+        self.tracer = tracer
+        self.hall_calls.tracer = tracer
+
+    def car_stops(self, idx):
+        ''' floors the riders in elevator idx still need to get to '''
+        return self.loads[idx].stops() if self.loads is not None else []
+
+    def rider_arrived(self, rider):
+        self.call_elevator(rider.origin, rider.dest)
+
+    def elevators_moved(self):
+        ''' the model moved the elevators, or changed their state '''
+        pass
+
+    def call_elevator(self, floor, dest):
+        ''' a rider at floor pressed the hall button towards dest '''
+        self.register_call(floor, Direction.UP if dest > floor else Direction.DOWN)
+
+    def register_call(self, floor, direction):
+        self.hall_calls.register(floor, direction)
+
+    def doors_opened(self, idx, floor, direction):
+        ''' elevator idx has its doors open at floor to take riders going in direction '''
+        self.hall_calls.clear(floor, direction)
+        self.hall_calls.release(idx)
+
+    def boarding_direction(self, idx, floor):
+        ''' direction of the riders elevator idx takes at floor, None to leave it to the riders '''
+        return None
 
     def request(self, dest: int):
         raise NotImplementedError("request must be implemented in subclass")
@@ -108,28 +296,28 @@ class Controller:
     def update(self):
         raise NotImplementedError("update must be implemented in subclass")
 
-    def call_elevator(self):
-        raise NotImplementedError("update must be implemented in subclass")
-
 
 class Testing(Controller):
 
-    def __init__(self, elevators):
-        super().__init__(elevators)
+    def __init__(self, elevators, loads=None):
+        super().__init__(elevators, loads)
         self.time = 0
 
     def assign_elevator(self):
         self.time += 1
         if self.time == 3:
             self.elevators[0].goto(2)
-        elif self.time == 5:
+        elif self.time == 5 and self.num_elevators > 1:
             self.elevators[1].goto(1)
 
     def update(self):
         self.assign_elevator()
 
     def request(self, origin: int, dest: int):
-        print(f"time {self.time}: received request from {origin} to go to {dest}")
+        pass
+
+    def call_elevator(self, floor, dest):
+        pass
 
     def elevator_floor_update(self):
         pass
@@ -140,39 +328,24 @@ class Fifo(Controller):
         pass
 
     def update(self):
-        if self.requests:
-            self.process_next_request()
+        if self.hall_calls:
+            self.process_requests()
 
     def request(self, elevator: int, dest: int):
         # print(f"Received request to {dest} in elevator {elevator}")
-        # self.requests.append(dest)
         elevator.goto(dest)
 
-    def call_elevator(self, floor):
-        print(f"Received request to {floor}")
-        self.requests.append(floor)
-
-    def process_next_request(self):
-        request = self.requests.pop(0)
-        fulfilled = False
-
-        # look for idle elevator in the destination floor
-        for elevator in self.elevators:
-            if elevator.state == State.IDLE_CLOSED and int(elevator.floor) == request:
-                fulfilled = True
+    def process_requests(self):
+        # oldest calls first, each to the nearest idle elevator, until there are no idle elevators
+        idle = [elevator for elevator in self.elevators
+                if elevator.state in (State.IDLE_CLOSED, State.IDLE_OPEN) and elevator.goal is None]
+        for floor, direction in self.hall_calls.unassigned():
+            if not idle:
                 break
-
-        # if no idle elevator is in origin floor, assign any idle elevator to go to the origin floor
-        if not fulfilled:
-            for elevator in self.elevators:
-                if elevator.state == State.IDLE_CLOSED and elevator.goal is None:
-                    fulfilled = True
-                    elevator.goto(request)
-                    break
-
-        # if not served, return the request
-        if not fulfilled:
-            self.requests.insert(0, request)
+            elevator = min(idle, key=lambda elevator: abs(elevator.floor - floor))
+            idle.remove(elevator)
+            self.hall_calls.assign(floor, direction, elevator.id)
+            elevator.goto(floor)
 
     '''
     def next_request(self, up_direction):
@@ -190,43 +363,297 @@ class Fifo(Controller):
     '''
 
 
-class Rider:
+def lowest_bit(bits):
+    return (bits & -bits).bit_length() - 1
+
+
+class Collective(Controller):
+    ''' collective control (LOOK): each elevator sweeps one way stopping at every floor in its stop set, then
+    reverses. stop sets are bitsets of floors: car calls of the riders inside, and the hall calls assigned to the
+    elevator, by direction. an elevator heading for a turnaround stop (a down call above it while going up)
+    takes the stops of its own direction on the way '''
+
+    def __init__(self, elevators, loads=None):
+        super().__init__(elevators, loads)
+        self.car_calls = [0] * self.num_elevators
+        self.hall_up = [0] * self.num_elevators
+        self.hall_down = [0] * self.num_elevators
+        self.sweep = [Direction.UP] * self.num_elevators
+
+    def request(self, elevator, dest):
+        self.car_calls[elevator.id] |= 1 << dest
+
+    def stops(self, idx, direction):
+        ''' floors to stop at while going in direction '''
+        hall = self.hall_up[idx] if direction == Direction.UP else self.hall_down[idx]
+        return self.car_calls[idx] | hall
+
+    def _next_stop(self, idx, floor, direction):
+        ''' next stop going in direction from floor (included): the nearest stop of that direction,
+        or else the farthest call of the other direction, where the elevator will turn around '''
+        if direction == Direction.UP:
+            ahead = self.stops(idx, Direction.UP) >> floor
+            if ahead:
+                return floor + lowest_bit(ahead)
+            turn = self.hall_down[idx] >> floor
+            return floor + turn.bit_length() - 1 if turn else None
+        below = (1 << (floor + 1)) - 1
+        ahead = self.stops(idx, Direction.DOWN) & below
+        if ahead:
+            return ahead.bit_length() - 1
+        turn = self.hall_up[idx] & below
+        return lowest_bit(turn) if turn else None
+
+    def _plan(self, idx, floor, here=True):
+        ''' (next stop, direction) of an elevator standing at floor, keeping its sweep direction if it can.
+        with here=False stops at floor itself are left out, they were just served or could not be '''
+        sweep = self.sweep[idx]
+        for direction in (sweep, Direction.DOWN if sweep == Direction.UP else Direction.UP):
+            start = floor if here else floor + (1 if direction == Direction.UP else -1)
+            stop = self._next_stop(idx, start, direction) if start >= 0 else None
+            if stop is not None:
+                return stop, direction
+        return None, sweep
+
+    def boarding_direction(self, idx, floor):
+        # the way the elevator leaves, as long as it has somewhere to go
+        everything = self.car_calls[idx] | self.hall_up[idx] | self.hall_down[idx]
+        above = everything >> (floor + 1) or self.hall_up[idx] >> floor & 1
+        below = everything & ((1 << floor) - 1) or self.hall_down[idx] >> floor & 1
+        if above and (self.sweep[idx] == Direction.UP or not below):
+            return Direction.UP
+        if below:
+            return Direction.DOWN
+        return None
 
-    riders_total = 0
+    def doors_opened(self, idx, floor, direction):
+        self.car_calls[idx] &= ~(1 << floor)
+        assigned = self.hall_calls.assigned_to(floor, direction)
+        if assigned is not None:
+            self._clear_hall_bit(assigned, floor, direction)
+        self._clear_hall_bit(idx, floor, direction)
+        self.hall_calls.clear(floor, direction)
+        self.sweep[idx] = direction
+
+    def _passing(self, idx, floor):
+        # a full elevator heading for a hall call it gave back goes on to its next car call instead
+        return not self.car_calls[idx] >> floor & 1 and self.full(idx)
+
+    def _clear_hall_bit(self, idx, floor, direction):
+        if direction == Direction.UP:
+            self.hall_up[idx] &= ~(1 << floor)
+        else:
+            self.hall_down[idx] &= ~(1 << floor)
+
+    def _cost(self, idx, floor, direction):
+        ''' floors to travel before elevator idx gets to a call at floor going in direction '''
+        elevator = self.elevators[idx]
+        position = elevator.floor
+        everything = self.car_calls[idx] | self.hall_up[idx] | self.hall_down[idx]
+        if not everything and elevator.goal is None:
+            cost = abs(position - floor)
+        else:
+            top = max(everything.bit_length() - 1, floor, position)
+            bottom = min(lowest_bit(everything) if everything else floor, floor, position)
+            if self.sweep[idx] == Direction.UP:
+                if direction == Direction.UP and floor >= position:
+                    cost = floor - position
+                elif direction == Direction.DOWN:
+                    cost = (top - position) + (top - floor)
+                else:
+                    cost = (top - position) + (top - bottom) + (floor - bottom)
+            else:
+                if direction == Direction.DOWN and floor <= position:
+                    cost = position - floor
+                elif direction == Direction.UP:
+                    cost = (position - bottom) + (floor - bottom)
+                else:
+                    cost = (position - bottom) + (top - bottom) + (top - floor)
+        return cost
+
+    def full(self, idx):
+        return self.loads is not None and len(self.loads[idx]) >= self.elevators[idx].capacity
+
+    def release(self, idx):
+        ''' a full elevator gives its hall calls back, for the others to take, instead of stopping where
+        nobody can get on '''
+        self.hall_up[idx] = 0
+        self.hall_down[idx] = 0
+        self.hall_calls.release(idx)
 
-    def __init__(self, num_floors, rng, spawn_time, controller):
-        ''' rng is random generator
-        1. randomizing origin floor: 50% from floor 0 and up, the other 50% distributed between all floors
-        2. randomizing destination floor: if origin NOT 0, most probable to go to 0
-        '''
+    def assign_elevator(self):
+        # full elevators take no calls
+        candidates = [idx for idx in range(self.num_elevators) if not self.full(idx)]
+        if not candidates:
+            return
+        for floor, direction in self.hall_calls.unassigned():
+            idx = min(candidates, key=lambda idx: self._cost(idx, floor, direction))
+            self.hall_calls.assign(floor, direction, idx)
+            if direction == Direction.UP:
+                self.hall_up[idx] |= 1 << floor
+            else:
+                self.hall_down[idx] |= 1 << floor
+
+    def update(self):
+        for idx in range(self.num_elevators):
+            if (self.hall_up[idx] or self.hall_down[idx]) and self.full(idx):
+                self.release(idx)
+        self.assign_elevator()
+        for idx, elevator in enumerate(self.elevators):
+            if elevator.goal is None and elevator.state in (State.IDLE_CLOSED, State.IDLE_OPEN):
+                floor = round(elevator.floor)
+                stop, self.sweep[idx] = self._plan(idx, floor, here=elevator.state == State.IDLE_CLOSED)
+                if stop is not None:
+                    elevator.goto(stop)  # to the same floor opens the doors
+            elif elevator.state == State.UP:
+                # stop on the way if there is still room to slow down
+                ahead = self.stops(idx, Direction.UP) >> (math.ceil(elevator.floor) + 1)
+                if ahead:
+                    stop = math.ceil(elevator.floor) + 1 + lowest_bit(ahead)
+                    if stop < elevator.goal or self._passing(idx, elevator.goal):
+                        elevator.goto(stop)
+            elif elevator.state == State.DOWN:
+                ahead = self.stops(idx, Direction.DOWN) & ((1 << math.floor(elevator.floor)) - 1)
+                if ahead:
+                    stop = ahead.bit_length() - 1
+                    if stop > elevator.goal or self._passing(idx, elevator.goal):
+                        elevator.goto(stop)
+
+
+class FloorQueue:
+    ''' riders waiting at one floor in arrival order, split by the direction they go. riders assigned to a car
+    are also queued by (direction, car), so a car boards its own riders without scanning the others. those leave
+    up and down lazily: they are skipped until they get to the front '''
+
+    def __init__(self, floor, num_floors):
+        self.floor = floor
+        self.up = deque()
+        self.down = deque()
+        self.by_car = {}  # (direction, car) -> riders assigned to car, in arrival order
+        self._gone = set()  # ids of riders boarded from by_car but still in up or down
+        self.dest_count = [0] * num_floors  # waiting riders by destination floor
+        self.changes = 0  # riders added or boarded, see snapshot.Snapshots
+
+    def __len__(self):
+        return len(self.up) + len(self.down) - len(self._gone)
+
+    def __iter__(self):
+        riders = itertools.chain(self.up, self.down)
+        if not self._gone:
+            return riders
+        return (rider for rider in riders if rider.id not in self._gone)
+
+    def append(self, rider):
+        if rider.dest > self.floor:
+            direction, riders = Direction.UP, self.up
+        else:
+            direction, riders = Direction.DOWN, self.down
+        riders.append(rider)
+        if rider.car is not None:
+            self.by_car.setdefault((direction, rider.car), deque()).append(rider)
+        self.dest_count[rider.dest] += 1
+        self.changes += 1
+
+    def waiting(self, direction):
+        ''' riders going in direction, empty when there are none, the first one is waiting '''
+        return self.up if direction == Direction.UP else self.down
+
+    def board(self, direction, max_riders, car=None):
+        ''' remove and return up to max_riders of the first riders going in direction,
+        only riders assigned to car when it is given '''
+        riders = self.waiting(direction)
+        boarded = []
+        if car is None:
+            while riders and len(boarded) < max_riders:
+                rider = riders.popleft()
+                if rider.id in self._gone:
+                    self._gone.discard(rider.id)
+                else:
+                    boarded.append(rider)
+        else:
+            assigned = self.by_car.get((direction, car), ())
+            while assigned and len(boarded) < max_riders:
+                rider = assigned.popleft()
+                if rider.car == car:  # otherwise reassigned, see follow_assignments
+                    boarded.append(rider)
+                    self._gone.add(rider.id)
+            while riders and riders[0].id in self._gone:
+                self._gone.discard(riders.popleft().id)
+        for rider in boarded:
+            self.dest_count[rider.dest] -= 1
+        if boarded:
+            self.changes += 1
+        return boarded
+
+    def follow_assignments(self, direction, car):
+        ''' move the riders of car going in direction that were assigned another car since '''
+        assigned = self.by_car.get((direction, car))
+        if not assigned or all(rider.car == car for rider in assigned):
+            return
+        self.by_car[direction, car] = deque(rider for rider in assigned if rider.car == car)
+        for rider in assigned:
+            if rider.car != car:
+                other = self.by_car.setdefault((direction, rider.car), deque())
+                # keep arrival order, reassigned riders are among the oldest
+                position = next((idx for idx, waiting in enumerate(other) if waiting.id > rider.id), len(other))
+                other.insert(position, rider)
+
+
+class CarLoad:
+    ''' riders in one elevator, indexed by destination floor '''
+
+    def __init__(self, num_floors):
+        self.by_dest = [[] for _ in range(num_floors)]
+        self.count = [0] * num_floors  # riders by destination floor
+        self.total = 0
+        self.changes = 0  # riders added or alighted, see snapshot.Snapshots
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.by_dest)
+
+    def append(self, rider):
+        self.by_dest[rider.dest].append(rider)
+        self.count[rider.dest] += 1
+        self.total += 1
+        self.changes += 1
+
+    def alight(self, floor):
+        ''' remove and return the riders going to floor '''
+        riders = self.by_dest[floor]
+        if riders:
+            self.by_dest[floor] = []
+            self.count[floor] = 0
+            self.total -= len(riders)
+            self.changes += 1
+        return riders
+
+    def stops(self):
+        return [floor for floor, count in enumerate(self.count) if count]
+
+    def any_above(self, floor):
+        return any(self.count[floor + 1:])
+
+    def any_below(self, floor):
+        return any(self.count[:floor])
 
-        # unique ID for each rider
-        self.id = self.riders_total
-        Rider.riders_total += 1
 
-        # generating probabilities
-        origin_floor_prob = [0.5] + (num_floors - 1) * [0.5 / (num_floors - 1)]
-        # if origin NOT 0, probability to select 0 or others ** must zero origin floor **
-        prob_dest_is_0 = 0.8
+class Rider:
+    ''' a rider is plain data, the model talks to the controller on its behalf.
+    origin and destination floors are drawn by the arrival stream, see arrivals.py '''
 
-        # randomizing origin and destination floors
-        origin_floor = rng.choice(range(num_floors), p=origin_floor_prob)
-        if origin_floor == 0:
-            dest_floor = int(rng.choice(range(1, num_floors)))
-        else:
-            dest_prob = [prob_dest_is_0] + (num_floors - 1) * [(1 - prob_dest_is_0) / (num_floors - 2)]
-            dest_prob[origin_floor] = 0
-            dest_floor = rng.choice(range(num_floors), p=dest_prob)
+    __slots__ = ("id", "origin", "dest", "spawn_time", "board_time", "alight_time", "car")
 
-        self.origin = int(origin_floor)
-        self.dest = int(dest_floor)
+    def __init__(self, rider_id, origin, dest, spawn_time):
+        self.id = rider_id  # unique per model
+        self.origin = int(origin)
+        self.dest = int(dest)
         self.spawn_time = spawn_time
-        self.controller = controller
-        self.controller.call_elevator(self.origin)
-
-    def enter(self, elevator):
-        # print(f"Entering elevator {elevator}")
-        self.controller.request(elevator, self.dest)
+        self.board_time = None
+        self.alight_time = None
+        self.car = None  # elevator assigned by a destination dispatch controller
 
     def __str__(self):
         return f"Rider from floor {self.origin} to {self.dest}, spawned at {self.spawn_time}"
@@ -235,6 +662,7 @@ class Rider:
 class Elevator:
     time_to_floor = 2  # seconds
     time_to_floor_slow = 20  # seconds
+    tracer = None
 
     def __init__(self, elevator_id, initial_floor=0.0, capacity=4):
         self.id = elevator_id
@@ -257,6 +685,8 @@ class Elevator:
         if self.state == State.IDLE_OPEN:
             if not self.goal is None:
                 self.state = State.IDLE_CLOSED  # TODO add timeout
+                if self.tracer is not None:
+                    self.tracer.emit(DOOR, elevator=self.id, floor=round(self.floor), value=0)
                 return
 
         if self.state == State.IDLE_CLOSED:
@@ -264,18 +694,21 @@ class Elevator:
                 return
             if int(self.floor) == self.goal:
                 self.state = State.IDLE_OPEN
-                print(f"elevator {self.id} is in state {self.state.value}")
                 self.goal = None
-                print(f"Elevator {self.id} arrived at floor {self.floor}")
+                if self.tracer is not None:
+                    self.tracer.emit(DOOR, elevator=self.id, floor=round(self.floor), value=1)
             elif self.goal > self.floor:
                 self.state = State.UP
                 self._direction = Direction.UP
                 self.slow_if_near()
+                if self.tracer is not None:
+                    self.tracer.emit(DEPART, elevator=self.id, floor=round(self.floor), value=self.goal)
             elif self.goal < self.floor:
                 self.state = State.DOWN
-                print(f"elevator {self.id} changed state to down")
                 self._direction = Direction.DOWN
                 self.slow_if_near()
+                if self.tracer is not None:
+                    self.tracer.emit(DEPART, elevator=self.id, floor=round(self.floor), value=self.goal)
             return  # not check if at floor before elevator moves
 
         # if on the move
@@ -297,7 +730,8 @@ class Elevator:
         if round(self.floor) == self.goal:
             self.state = State.IDLE_CLOSED
             self.floor = round(self.floor, 0)
-            print(f"elevator {self.id} changed state to IDLE_CLOSED at goal floor")
+            if self.tracer is not None:
+                self.tracer.emit(ARRIVE, elevator=self.id, floor=round(self.floor))
         else:
             self.slow_if_near()
 
@@ -319,6 +753,14 @@ class Elevator:
             self.state = State.DOWN_SLOW
 
 
+# controllers selectable by name, e.g. from the command line
+CONTROLLERS = {
+    "fifo": Fifo,
+    "collective": Collective,
+    "testing": Testing,
+}
+
+
 if __name__ == "__main__":
     model = ElevatorModel(5, 2)
     print(model.get_state())
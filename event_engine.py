@@ -0,0 +1,144 @@
+import heapq
+import math
+
+from elevator_model import ElevatorModel, State
+
+MOVING = {
+    State.UP: 1,
+    State.DOWN: -1,
+    State.UP_SLOW: 1,
+    State.DOWN_SLOW: -1,
+}
+SLOW = (State.UP_SLOW, State.DOWN_SLOW)
+
+# event kinds, also used as tie breakers for simultaneous events
+SPAWN = 0
+FLOOR = 1
+
+
+class EventModel(ElevatorModel):
+    ''' discrete event version of ElevatorModel
+    instead of polling every elevator and floor on each tick, the model jumps from one event to the next:
+    rider arrival, and an elevator reaching a floor (which is where it slows down or stops at its goal).
+    door open/close and departure happen at the instant they are decided, which is what the tick engine
+    converges to as delta_time goes to 0. results do not depend on the delta_time given to update() '''
+
+    max_settle_rounds = 100
+
+    def __init__(self, num_floors, num_elevators, **kwargs):
+        super().__init__(num_floors, num_elevators, **kwargs)
+        self.events_processed = 0
+        self._events = []
+        self._sequence = 0  # tie breaker of simultaneous events of the same kind
+        self._version = [0] * self.num_elevators  # invalidates floor events of an elevator
+        self._motion = [None] * self.num_elevators  # (start time, start floor, floors per second)
+
+        self._push(self.next_rider_spawn_time, SPAWN, None, None)
+        self._settle()
+
+    def _push(self, event_time, kind, elevator_id, version):
+        self._sequence += 1
+        heapq.heappush(self._events, (event_time, kind, self._sequence, elevator_id, version))
+
+    def set_arrivals(self, arrivals):
+        super().set_arrivals(arrivals)
+        self._events = [event for event in self._events if event[1] != SPAWN]
+        heapq.heapify(self._events)
+        self._push(self.next_rider_spawn_time, SPAWN, None, None)
+
+    def next_event_time(self):
+        while self._events:
+            event_time, kind, _, elevator_id, version = self._events[0]
+            if kind == FLOOR and version != self._version[elevator_id]:
+                heapq.heappop(self._events)  # stale
+                continue
+            return event_time
+        return math.inf
+
+    def update(self, delta_time):
+        self.run_until(self.time + delta_time)
+        if self.recorder is not None and not self.recorder.every_event:
+            self.recorder.record(self)
+
+    def run_until(self, end_time):
+        while self.next_event_time() <= end_time:
+            event_time, kind, _, elevator_id, _ = heapq.heappop(self._events)
+            self.time = event_time
+            self._sync_floors()
+            if kind == SPAWN:
+                self.spawn_rider()
+                self._push(self.next_rider_spawn_time, SPAWN, None, None)
+            else:
+                self._reach_floor(elevator_id)
+            self._settle()
+            self.events_processed += 1
+            if self.recorder is not None and self.recorder.every_event:
+                self.recorder.record(self)
+        self.time = end_time
+        self._sync_floors()
+
+    def _reach_floor(self, elevator_id):
+        elevator = self.elevators[elevator_id]
+        start_time, start_floor, speed = self._motion[elevator_id]
+        elevator.floor = float(round(start_floor + speed * (self.time - start_time)))
+        elevator._at_floor = True
+        elevator.action_at_floor()
+        self._motion[elevator_id] = None  # moves on at a new speed, or stops
+        self.controller.elevators_moved()
+
+    def _sync_floors(self):
+        for elevator_id, motion in enumerate(self._motion):
+            if motion is not None:
+                start_time, start_floor, speed = motion
+                self.elevators[elevator_id].floor = start_floor + speed * (self.time - start_time)
+        self.controller.elevators_moved()
+
+    def _step_elevators(self, delta_time):
+        # moving elevators advance between floor events only
+        for elevator in self.elevators:
+            if elevator.state not in MOVING:
+                elevator.update(delta_time)
+
+    def _fingerprint(self):
+        return (tuple((elevator.state, elevator.goal) for elevator in self.elevators),
+                tuple(self.controller.hall_calls.calls.items()),
+                sum(len(queue) for queue in self.queues),
+                sum(len(riders) for riders in self.riders_in_elevator))
+
+    def _settle(self):
+        # apply every zero-duration decision (dispatch, doors, boarding, departure) until nothing changes
+        for _ in range(self.max_settle_rounds):
+            before = self._fingerprint()
+            self.controller.update()
+            self._step_elevators(0)
+            self.controller.elevators_moved()
+            self.enter_exit_elevators()
+            if self._fingerprint() == before:
+                break
+
+        for elevator_id, elevator in enumerate(self.elevators):
+            if elevator.state in MOVING and self._motion[elevator_id] is None:
+                self._schedule_floor(elevator_id)
+            elif elevator.state not in MOVING and self._motion[elevator_id] is not None:
+                self._motion[elevator_id] = None
+                self._version[elevator_id] += 1
+
+    def _schedule_floor(self, elevator_id):
+        elevator = self.elevators[elevator_id]
+        direction = MOVING[elevator.state]
+        time_to_floor = elevator.time_to_floor_slow if elevator.state in SLOW else elevator.time_to_floor
+        if direction > 0:
+            next_floor = math.floor(elevator.floor) + 1
+        else:
+            next_floor = math.ceil(elevator.floor) - 1
+
+        self._motion[elevator_id] = (self.time, elevator.floor, direction / time_to_floor)
+        self._version[elevator_id] += 1
+        event_time = self.time + abs(next_floor - elevator.floor) * time_to_floor
+        self._push(event_time, FLOOR, elevator_id, self._version[elevator_id])
+
+
+if __name__ == "__main__":
+    model = EventModel(5, 2)
+    model.update(3600)
+    print(f"{model.events_processed} events, {model.metrics.served} riders served")
@@ -0,0 +1,145 @@
+import argparse
+import collections
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # stdout may be the video
+import pygame
+
+import checkpoint
+from batch import add_model_arguments, make_model, model_config
+from recording import Replay
+from visualizer import ElevatorRenderer
+
+
+def encode_png(data, size, path):
+    ''' runs in a worker process '''
+    pygame.image.save(pygame.image.frombuffer(data, size, "RGB"), path)
+    return path
+
+
+class PngWriter:
+    ''' frames as numbered png files in directory, encoded by a pool of worker processes. at most pending frames
+    wait for their worker, beyond that write() waits, so memory stays bounded when encoding is the slow part '''
+
+    def __init__(self, directory, size, workers=None, pending=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.size = size
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.pending = collections.deque()
+        self.max_pending = pending or 4 * (workers or os.cpu_count() or 1)
+        self.frames = 0
+
+    def write(self, data):
+        path = os.path.join(self.directory, f"frame_{self.frames:06d}.png")
+        self.pending.append(self.executor.submit(encode_png, data, self.size, path))
+        self.frames += 1
+        while len(self.pending) > self.max_pending:
+            self.pending.popleft().result()
+
+    def close(self):
+        while self.pending:
+            self.pending.popleft().result()
+        self.executor.shutdown()
+
+
+class RawWriter:
+    ''' frames as one raw rgb24 stream, to a file or to stdout with "-", written in order by a background thread.
+    e.g. ffmpeg -f rawvideo -pix_fmt rgb24 -s 600x600 -r 30 -i frames.raw video.mp4 '''
+
+    def __init__(self, path, size, workers=None, pending=None):
+        self.file = sys.stdout.buffer if path == "-" else open(path, "wb")
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = collections.deque()
+        self.max_pending = pending or 16
+        self.frames = 0
+
+    def write(self, data):
+        self.pending.append(self.executor.submit(self.file.write, data))
+        self.frames += 1
+        while len(self.pending) > self.max_pending:
+            self.pending.popleft().result()
+
+    def close(self):
+        while self.pending:
+            self.pending.popleft().result()
+        self.executor.shutdown()
+        self.file.flush()
+        if self.file is not sys.stdout.buffer:
+            self.file.close()
+
+
+WRITERS = {
+    "png": PngWriter,
+    "raw": RawWriter,
+}
+
+
+def model_states(model, delta_time=1.0):
+    ''' state of model at a simulated time, running it forward in fixed steps up to that time '''
+    def state_at(sim_time):
+        while model.time < sim_time:
+            model.update(delta_time)
+        return model.get_state()
+    return state_at
+
+
+def replay_states(replay):
+    def state_at(sim_time):
+        return replay.get_state(replay.index_at(sim_time))
+    return state_at
+
+
+def export(state_at, renderer, writer, start_time, duration, interval=2.0):
+    ''' a frame every interval simulated seconds from start_time for duration simulated seconds, drawn off screen
+    by renderer and handed to writer. returns the number of frames '''
+    frames = int(duration // interval) + 1
+    for frame in range(frames):
+        renderer.render(state_at(start_time + frame * interval))
+        writer.write(pygame.image.tostring(renderer.window, "RGB"))
+    writer.close()
+    return frames
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render the elevator model off screen to png files or raw video")
+    parser.add_argument("output", help="directory of png frames, or raw video file, - for stdout")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="png")
+    parser.add_argument("--size", type=parse_size, default=(600, 600), help="frame size, e.g. 1280x720")
+    parser.add_argument("--interval", type=float, default=2.0, help="simulated seconds between frames")
+    parser.add_argument("--workers", type=int, default=None, help="encoding processes, default one per cpu")
+    parser.add_argument("--replay", help="recording to render, see recording.py, instead of running a model")
+    parser.add_argument("--resume", help="checkpoint to continue from, instead of a new model")
+    add_model_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    duration = args.hours * 3600
+    if args.replay:
+        replay = Replay(args.replay)
+        state_at, source, start_time = replay_states(replay), replay, replay.start_time
+        duration = min(duration, replay.end_time - start_time)
+    else:
+        model = checkpoint.load(args.resume) if args.resume else make_model(seed=args.seed, **model_config(args))
+        state_at, source, start_time = model_states(model, args.step), model, model.time
+
+    renderer = ElevatorRenderer(source, size=args.size, headless=True)
+    writer = WRITERS[args.format](args.output, args.size, workers=args.workers)
+    start = time.perf_counter()
+    frames = export(state_at, renderer, writer, start_time, duration, args.interval)
+    # stdout may be the video
+    print(f"{frames} frames of {args.size[0]}x{args.size[1]} in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
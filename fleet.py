@@ -0,0 +1,179 @@
+import numpy
+
+from elevator_model import ElevatorModel, Elevator, State, Direction
+from tracing import DEPART, ARRIVE, DOOR
+
+IDLE_CLOSED = State.IDLE_CLOSED.value
+IDLE_OPEN = State.IDLE_OPEN.value
+UP = State.UP.value
+DOWN = State.DOWN.value
+UP_SLOW = State.UP_SLOW.value
+DOWN_SLOW = State.DOWN_SLOW.value
+NO_GOAL = numpy.nan
+STATES = tuple(sorted(State, key=lambda state: state.value))  # by value, cheaper than State(value)
+
+
+class FleetArrays:
+    ''' structure of arrays store for a fleet of elevators
+    step() advances all elevators at once and follows Elevator.update exactly, transition by transition.
+    a missing goal is stored as nan '''
+
+    def __init__(self, num_elevators, initial_floor=0.0, capacity=4,
+                 time_to_floor=Elevator.time_to_floor, time_to_floor_slow=Elevator.time_to_floor_slow):
+        self.num_elevators = num_elevators
+        self.floor = numpy.full(num_elevators, initial_floor, dtype=float)
+        self.state = numpy.full(num_elevators, IDLE_OPEN, dtype=numpy.int8)
+        self.goal = numpy.full(num_elevators, NO_GOAL)
+        self.direction = numpy.full(num_elevators, Direction.UP.value, dtype=numpy.int8)
+        self.at_floor = numpy.ones(num_elevators, dtype=bool)
+        self.capacity = numpy.full(num_elevators, capacity, dtype=int)
+        self.time_to_floor = numpy.full(num_elevators, time_to_floor, dtype=float)
+        self.time_to_floor_slow = numpy.full(num_elevators, time_to_floor_slow, dtype=float)
+
+    @classmethod
+    def from_elevators(cls, elevators):
+        fleet = cls(len(elevators))
+        for idx, elevator in enumerate(elevators):
+            fleet.floor[idx] = elevator.floor
+            fleet.state[idx] = elevator.state.value
+            fleet.goal[idx] = NO_GOAL if elevator.goal is None else elevator.goal
+            fleet.direction[idx] = elevator._direction.value
+            fleet.at_floor[idx] = elevator._at_floor
+            fleet.capacity[idx] = elevator.capacity
+            fleet.time_to_floor[idx] = elevator.time_to_floor
+            fleet.time_to_floor_slow[idx] = elevator.time_to_floor_slow
+        return fleet
+
+    def views(self):
+        return [ElevatorView(self, idx) for idx in range(self.num_elevators)]
+
+    def goto(self, idx, floor):
+        self.goal[idx] = NO_GOAL if floor is None else floor
+
+    def step(self, delta_time):
+        state = self.state.copy()  # transitions are decided on the state at the start of the step
+        floor = self.floor
+        goal = self.goal
+        has_goal = ~numpy.isnan(goal)
+
+        # doors close once there is somewhere to go
+        self.state[(state == IDLE_OPEN) & has_goal] = IDLE_CLOSED
+
+        # closed elevators open at their goal or start moving towards it
+        start = (state == IDLE_CLOSED) & has_goal
+        if start.any():
+            arrived = start & (numpy.trunc(floor) == goal)
+            up = start & ~arrived & (goal > floor)
+            down = start & ~arrived & ~up & (goal < floor)
+            self.state[arrived] = IDLE_OPEN
+            goal[arrived] = NO_GOAL
+            self.state[up] = UP
+            self.direction[up] = Direction.UP.value
+            self.state[down] = DOWN
+            self.direction[down] = Direction.DOWN.value
+            self._slow_if_near(up | down)
+
+        # moving elevators advance and act when passing a floor
+        moving = state >= UP
+        idle_open = (state == IDLE_OPEN) & ~has_goal
+        slow = (state == UP_SLOW) | (state == DOWN_SLOW)
+        step_size = numpy.where(slow, delta_time / self.time_to_floor_slow, delta_time / self.time_to_floor)
+        going_up = (state == UP) | (state == UP_SLOW)
+        floor[moving & going_up] += step_size[moving & going_up]
+        floor[moving & ~going_up] -= step_size[moving & ~going_up]
+
+        detect = moving | idle_open
+        at_floor = numpy.abs(floor - numpy.round(floor)) < step_size
+        self.at_floor[detect] = at_floor[detect]
+
+        at_floor &= moving
+        if at_floor.any():
+            at_goal = at_floor & (numpy.round(floor) == goal)
+            self.state[at_goal] = IDLE_CLOSED
+            floor[at_goal] = numpy.round(floor[at_goal])
+            self._slow_if_near(at_floor & ~at_goal)
+
+    def _slow_if_near(self, mask):
+        rounded = numpy.round(self.floor)
+        self.state[mask & (self.state == UP) & (self.goal - rounded == 1)] = UP_SLOW
+        self.state[mask & (self.state == DOWN) & (rounded - self.goal == 1)] = DOWN_SLOW
+
+
+class ElevatorView:
+    ''' Elevator look-alike backed by one slot of a FleetArrays, for controllers and the model '''
+
+    def __init__(self, fleet, idx):
+        self.fleet = fleet
+        self.id = idx
+
+    @property
+    def floor(self):
+        return float(self.fleet.floor[self.id])
+
+    @property
+    def state(self):
+        return STATES[self.fleet.state[self.id]]
+
+    @property
+    def goal(self):
+        goal = self.fleet.goal[self.id]
+        return None if goal != goal else int(goal)  # nan
+
+    @property
+    def capacity(self):
+        return int(self.fleet.capacity[self.id])
+
+    @property
+    def time_to_floor(self):
+        return float(self.fleet.time_to_floor[self.id])
+
+    @property
+    def time_to_floor_slow(self):
+        return float(self.fleet.time_to_floor_slow[self.id])
+
+    @property
+    def _direction(self):
+        return Direction(int(self.fleet.direction[self.id]))
+
+    def goto(self, floor):
+        self.fleet.goto(self.id, floor)
+
+    def __str__(self):
+        return f"Elevator {self.id} is at {self.floor} and is in {self.state}"
+
+
+class VectorFleetModel(ElevatorModel):
+    ''' ElevatorModel with the fleet kept in FleetArrays and stepped in one call per update '''
+
+    def _make_elevators(self, capacity, time_to_floor=None):
+        if time_to_floor is None:
+            time_to_floor = Elevator.time_to_floor
+        self.fleet = FleetArrays(self.num_elevators, capacity=capacity, time_to_floor=time_to_floor)
+        return self.fleet.views()
+
+    def _open_elevators(self):
+        return numpy.flatnonzero(self.fleet.state == IDLE_OPEN).tolist()
+
+    def _step_elevators(self, delta_time):
+        if self.tracer is None:
+            self.fleet.step(delta_time)
+        else:
+            before = self.fleet.state.copy()
+            self.fleet.step(delta_time)
+            self._trace_transitions(before, self.fleet.state)
+
+    def _trace_transitions(self, before, after):
+        # the events Elevator.update emits, found from the state change of each elevator
+        moving_before = before >= UP
+        moving_after = after >= UP
+        changed = numpy.nonzero(before != after)[0]
+        for idx in changed:
+            floor = round(self.fleet.floor[idx])
+            if before[idx] == IDLE_OPEN:
+                self.tracer.emit(DOOR, elevator=idx, floor=floor, value=0)
+            elif after[idx] == IDLE_OPEN:
+                self.tracer.emit(DOOR, elevator=idx, floor=floor, value=1)
+            elif not moving_before[idx] and moving_after[idx]:
+                self.tracer.emit(DEPART, elevator=idx, floor=floor, value=self.fleet.goal[idx])
+            elif moving_before[idx] and not moving_after[idx]:
+                self.tracer.emit(ARRIVE, elevator=idx, floor=floor)
@@ -0,0 +1,212 @@
+import math
+
+
+class RunningStats:
+    ''' count, mean, variance, min and max of a stream of values, in constant memory (Welford) '''
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def merge(self, other):
+        ''' add the values of other, as if they were added one by one (Chan et al.) '''
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self._m2, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count, stats.mean, stats._m2 = data["count"], data["mean"], data["m2"]
+        stats.min, stats.max = data["min"], data["max"]
+        return stats
+
+
+class QuantileSketch:
+    ''' quantiles of a stream of non negative values within a relative error (log bucketed, like DDSketch)
+    memory grows with the log of the value range, not with the number of values. sketches with the same
+    relative_error merge exactly '''
+
+    min_value = 1e-6  # smaller values count as zeros
+
+    def __init__(self, relative_error=0.01):
+        self.relative_error = relative_error
+        self._gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets = {}  # bucket index -> count
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value < self.min_value:
+            self.zeros += 1
+            return
+        bucket = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if rank < seen:
+                # middle of the bucket (gamma^(i-1), gamma^i] in relative terms
+                return 2 * self._gamma ** bucket / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.buckets) / (self._gamma + 1)
+
+    def merge(self, other):
+        if other.relative_error != self.relative_error:
+            raise ValueError("can only merge sketches with the same relative error")
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def to_dict(self):
+        return {"relative_error": self.relative_error, "zeros": self.zeros,
+                "buckets": {str(bucket): count for bucket, count in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relative_error"])
+        sketch.buckets = {int(bucket): count for bucket, count in data["buckets"].items()}
+        sketch.zeros = data["zeros"]
+        sketch.count = sketch.zeros + sum(sketch.buckets.values())
+        return sketch
+
+
+class Distribution:
+    ''' running stats and quantile sketch of one measure '''
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch()
+
+    def add(self, value):
+        self.stats.add(value)
+        self.sketch.add(value)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+
+    def summary(self):
+        return {
+            "mean": self.stats.mean if self.stats.count else math.nan,
+            "std": self.stats.std,
+            "p50": self.sketch.quantile(0.5),
+            "p95": self.sketch.quantile(0.95),
+            "p99": self.sketch.quantile(0.99),
+            "max": self.stats.max if self.stats.count else math.nan,
+        }
+
+    def to_dict(self):
+        return {"stats": self.stats.to_dict(), "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        distribution = cls()
+        distribution.stats = RunningStats.from_dict(data["stats"])
+        distribution.sketch = QuantileSketch.from_dict(data["sketch"])
+        return distribution
+
+
+MEASURES = ("wait", "ride", "journey")
+
+
+class JourneyMetrics:
+    ''' wait (spawn to board), ride (board to alight) and journey (spawn to alight) times of riders,
+    overall, per origin floor and per elevator. fed by the model as riders board and alight '''
+
+    def __init__(self, num_floors, num_elevators):
+        self.total = self._measures()
+        self.per_floor = [self._measures() for _ in range(num_floors)]
+        self.per_elevator = [self._measures() for _ in range(num_elevators)]
+        self.boarded = 0
+        self.served = 0
+
+    @staticmethod
+    def _measures():
+        return {measure: Distribution() for measure in MEASURES}
+
+    def _add(self, measure, value, floor, elevator):
+        self.total[measure].add(value)
+        self.per_floor[floor][measure].add(value)
+        self.per_elevator[elevator][measure].add(value)
+
+    def board(self, rider, elevator, time):
+        self.boarded += 1
+        self._add("wait", time - rider.spawn_time, rider.origin, elevator)
+
+    def alight(self, rider, elevator, time):
+        self.served += 1
+        self._add("ride", time - rider.board_time, rider.origin, elevator)
+        self._add("journey", time - rider.spawn_time, rider.origin, elevator)
+
+    def merge(self, other):
+        ''' add another run of the same building, e.g. a parallel replication '''
+        for mine, theirs in zip([self.total] + self.per_floor + self.per_elevator,
+                                [other.total] + other.per_floor + other.per_elevator):
+            for measure in MEASURES:
+                mine[measure].merge(theirs[measure])
+        self.boarded += other.boarded
+        self.served += other.served
+
+    def summary(self):
+        return {measure: self.total[measure].summary() for measure in MEASURES}
+
+    def to_dict(self):
+        def measures_dict(measures):
+            return {measure: measures[measure].to_dict() for measure in MEASURES}
+        return {
+            "total": measures_dict(self.total),
+            "per_floor": [measures_dict(measures) for measures in self.per_floor],
+            "per_elevator": [measures_dict(measures) for measures in self.per_elevator],
+            "boarded": self.boarded,
+            "served": self.served,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        def measures_from_dict(measures):
+            return {measure: Distribution.from_dict(measures[measure]) for measure in MEASURES}
+        metrics = cls(0, 0)
+        metrics.total = measures_from_dict(data["total"])
+        metrics.per_floor = [measures_from_dict(measures) for measures in data["per_floor"]]
+        metrics.per_elevator = [measures_from_dict(measures) for measures in data["per_elevator"]]
+        metrics.boarded = data["boarded"]
+        metrics.served = data["served"]
+        return metrics
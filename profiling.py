@@ -0,0 +1,100 @@
+import json
+import time
+
+# phase -> (object the method is on, method name), "model" or "controller"
+PHASES = {
+    "update": ("model", "update"),
+    "controller": ("controller", "update"),
+    "elevators": ("model", "_step_elevators"),
+    "spawn": ("model", "spawn_rider"),
+    "boarding": ("model", "enter_exit_elevators"),
+}
+HISTOGRAM_BUCKETS = 64  # power of two buckets of nanoseconds
+
+
+class PhaseStats:
+    ''' call count, total and max time, and a power of two histogram of the durations of one phase '''
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS  # bucket i counts durations in [2^(i-1), 2^i) ns
+
+    def add(self, duration_ns):
+        self.calls += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        self.histogram[duration_ns.bit_length()] += 1
+
+    def quantile_ns(self, q):
+        ''' upper bound of the q quantile, within a factor of 2 '''
+        rank = q * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= rank:
+                return min(1 << bucket, self.max_ns)
+        return 0
+
+    def to_dict(self):
+        return {"calls": self.calls, "total_ns": self.total_ns, "max_ns": self.max_ns,
+                "histogram": {str(bucket): count for bucket, count in enumerate(self.histogram) if count}}
+
+
+class PhaseProfiler:
+    ''' time spent in each phase of ElevatorModel.update, see ElevatorModel.set_profiler.
+    attach() shadows the phase methods of a model with timed wrappers, detach() removes them, so a model
+    without a profiler runs its plain methods '''
+
+    def __init__(self, phases=PHASES):
+        self.targets = dict(phases)
+        self.phases = {phase: PhaseStats() for phase in self.targets}
+
+    def _timed(self, phase, method):
+        stats = self.phases[phase]
+        clock = time.perf_counter_ns
+
+        def timed(*args):
+            start = clock()
+            result = method(*args)
+            stats.add(clock() - start)
+            return result
+        return timed
+
+    def _owners(self, model):
+        return {"model": model, "controller": model.controller}
+
+    def attach(self, model):
+        owners = self._owners(model)
+        for phase, (owner, name) in self.targets.items():
+            setattr(owners[owner], name, self._timed(phase, getattr(owners[owner], name)))
+
+    def detach(self, model):
+        owners = self._owners(model)
+        for owner, name in self.targets.values():
+            owners[owner].__dict__.pop(name, None)
+
+    def reset(self):
+        self.phases = {phase: PhaseStats() for phase in self.targets}
+
+    def to_dict(self):
+        return {phase: stats.to_dict() for phase, stats in self.phases.items()}
+
+    def dump(self, path):
+        with open(path, "w") as dump_file:
+            json.dump(self.to_dict(), dump_file, indent=1)
+
+    def report(self):
+        ''' one line per phase, share is of the time in update '''
+        total_ns = self.phases["update"].total_ns if "update" in self.phases else 0
+        lines = [f"{'phase':<12}{'calls':>10}{'total ms':>11}{'mean us':>10}{'p50 us':>9}{'p99 us':>9}"
+                 f"{'max us':>10}{'share':>8}"]
+        for phase, stats in self.phases.items():
+            mean_us = stats.total_ns / stats.calls / 1e3 if stats.calls else 0.0
+            share = f"{stats.total_ns / total_ns:.0%}" if total_ns else "-"
+            lines.append(f"{phase:<12}{stats.calls:>10}{stats.total_ns / 1e6:>11.1f}{mean_us:>10.1f}"
+                         f"{stats.quantile_ns(0.5) / 1e3:>9.1f}{stats.quantile_ns(0.99) / 1e3:>9.1f}"
+                         f"{stats.max_ns / 1e3:>10.1f}{share:>8}")
+        return "\n".join(lines)
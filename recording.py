@@ -0,0 +1,207 @@
+import argparse
+import itertools
+import json
+import math
+import os
+
+import numpy
+
+
+def frame_dtype(num_floors, num_elevators, capacity, shown):
+    ''' one model state: elevator positions, states and loads, queue lengths, and rider ids for drawing them.
+    riders of a car and the first shown riders of a queue are kept by id, -1 marks an empty place '''
+    return numpy.dtype([
+        ("time", numpy.float64),
+        ("floor", numpy.float32, (num_elevators,)),
+        ("state", numpy.uint8, (num_elevators,)),
+        ("load", numpy.uint16, (num_elevators,)),
+        ("queue", numpy.uint32, (num_floors,)),
+        ("riders", numpy.int32, (num_elevators, capacity)),
+        ("queue_riders", numpy.int32, (num_floors, shown)),
+    ])
+
+
+class Recorder:
+    ''' records the model state after every update, or every interval simulated seconds, into a binary file of
+    frame_dtype records. frames are gathered as lists, one per field, and converted and written buffer_size frames
+    at a time. the layout goes to a json file next to the recording when the first frame is recorded, so a
+    recording can be replayed while it runs, see Replay. set on a model with ElevatorModel.set_recorder '''
+
+    def __init__(self, path, interval=0.0, buffer_size=1024, shown=8, every_event=False):
+        self.path = path
+        self.interval = interval
+        self._next_time = -math.inf
+        self.buffer_size = buffer_size
+        self.shown = shown
+        self.every_event = every_event  # event engine: a frame per event, not per update
+        self.frames = 0
+        self.file = None
+
+    def _start(self, model):
+        self.layout = {"num_floors": model.num_floors, "num_elevators": model.num_elevators,
+                       "capacity": max(elevator.capacity for elevator in model.elevators), "shown": self.shown}
+        self.dtype = frame_dtype(**self.layout)
+        self.columns = {name: [] for name in self.dtype.names}
+        with open(layout_path(self.path), "w") as layout_file:
+            json.dump(self.layout, layout_file)
+        self.file = open(self.path, "wb")
+
+    def record(self, model):
+        if model.time < self._next_time:
+            return
+        self._next_time = model.time + self.interval
+        if self.file is None:
+            self._start(model)
+        columns = self.columns
+        capacity, shown = self.layout["capacity"], self.shown
+
+        columns["time"].append(model.time)
+        columns["floor"].append([elevator.floor for elevator in model.elevators])
+        columns["state"].append([elevator.state.value for elevator in model.elevators])
+        columns["load"].append([len(riders) for riders in model.riders_in_elevator])
+        lengths = [len(queue) for queue in model.queues]
+        columns["queue"].append(lengths)
+        ids = []
+        for riders in model.riders_in_elevator:
+            ids.extend(rider.id for rider in riders)
+            ids.extend([-1] * (capacity - len(riders)))
+        columns["riders"].append(ids)
+        ids = []
+        empty = [-1] * shown
+        for queue, length in zip(model.queues, lengths):
+            if length:
+                waiting = [rider.id for rider in itertools.islice(queue, shown)]
+                ids.extend(waiting)
+                ids.extend(empty[len(waiting):])
+            else:
+                ids.extend(empty)
+        columns["queue_riders"].append(ids)
+
+        self.frames += 1
+        if len(columns["time"]) == self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.file is not None and self.columns["time"]:
+            frames = numpy.empty(len(self.columns["time"]), dtype=self.dtype)
+            for name, column in self.columns.items():
+                frames[name] = numpy.array(column).reshape(frames[name].shape)
+                column.clear()
+            frames.tofile(self.file)
+            self.file.flush()
+
+    def close(self):
+        if self.file is None:
+            return
+        self.flush()
+        self.file.close()
+
+
+def layout_path(path):
+    return path + ".json"
+
+
+class ReplayRider:
+    ''' stands in for a Rider when drawing a replay '''
+
+    __slots__ = ("id",)
+
+    def __init__(self, rider_id):
+        self.id = rider_id
+
+
+class Replay:
+    ''' memory mapped recording, looks like a model to ElevatorRenderer and gives it the state of any frame.
+    a recording still being written shows the frames flushed so far '''
+
+    def __init__(self, path):
+        with open(layout_path(path)) as layout_file:
+            layout = json.load(layout_file)
+        self.num_floors = layout["num_floors"]
+        self.num_elevators = layout["num_elevators"]
+        dtype = frame_dtype(**layout)
+        count = os.path.getsize(path) // dtype.itemsize  # a frame may be half written
+        if not count:
+            raise ValueError(f"{path} holds no complete frame yet")
+        self.frames = numpy.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def start_time(self):
+        return float(self.frames["time"][0])
+
+    @property
+    def end_time(self):
+        return float(self.frames["time"][-1])
+
+    def index_at(self, sim_time):
+        ''' last frame at or before sim_time '''
+        return max(int(numpy.searchsorted(self.frames["time"], sim_time, side="right")) - 1, 0)
+
+    def get_state(self, index):
+        ''' the frame in the form of ElevatorModel.get_state '''
+        frame = self.frames[index]
+        queues = []
+        for floor in range(self.num_floors):
+            known = [ReplayRider(int(rider_id)) for rider_id in frame["queue_riders"][floor] if rider_id >= 0]
+            queues.append(known + [ReplayRider(floor)] * (int(frame["queue"][floor]) - len(known)))
+        return {
+            "elevators_position": frame["floor"].astype(float).tolist(),
+            "queues": queues,
+            "riders_in_elevator": [[ReplayRider(int(rider_id)) for rider_id in riders[:load]]
+                                   for riders, load in zip(frame["riders"], frame["load"])],
+        }
+
+
+def play(path, speed=40.0, fps=20, start=None):
+    ''' show a recording in the pygame window, speed simulated seconds per second.
+    space pauses, left and right jump a minute, up and down double or halve the speed '''
+    import pygame
+    from visualizer import ElevatorRenderer
+
+    pygame.init()
+    replay = Replay(path)
+    renderer = ElevatorRenderer(replay)
+    clock = pygame.time.Clock()
+    sim_time = replay.start_time if start is None else start
+    paused = False
+    running = True
+
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_RIGHT:
+                    sim_time += 60
+                elif event.key == pygame.K_LEFT:
+                    sim_time -= 60
+                elif event.key == pygame.K_UP:
+                    speed *= 2
+                elif event.key == pygame.K_DOWN:
+                    speed /= 2
+
+        sim_time = min(max(sim_time, replay.start_time), replay.end_time)
+        renderer.render(replay.get_state(replay.index_at(sim_time)))
+        if not paused:
+            sim_time += speed / fps
+        clock.tick(fps)
+    pygame.quit()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recording of the elevator model")
+    parser.add_argument("path", help="recording, e.g. from batch.py --record")
+    parser.add_argument("--speed", type=float, default=40.0, help="simulated seconds per second")
+    parser.add_argument("--fps", type=int, default=20, help="frames per second")
+    parser.add_argument("--start", type=float, default=None, help="simulated time to start at")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    play(args.path, args.speed, args.fps, args.start)
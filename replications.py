@@ -0,0 +1,98 @@
+import argparse
+import math
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from batch import add_model_arguments, make_model, model_config, run, summarize
+from metrics import JourneyMetrics
+
+METRICS = ("wait_mean", "wait_p95", "ride_mean", "ride_p95", "served")
+
+
+def replication_seeds(base_seed, replications):
+    ''' independent seeds for each replication, derived from one base seed '''
+    children = numpy.random.SeedSequence(base_seed).spawn(replications)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def run_replication(config, seed, hours, delta_time=1.0):
+    model = make_model(seed=seed, **config)
+    wall_time = run(model, hours, delta_time)
+    summary = summarize(model, wall_time)
+    summary["seed"] = seed
+    summary["metrics"] = model.metrics.to_dict()  # mergeable with the other replications
+    return summary
+
+
+def t_quantile(probability, df):
+    ''' quantile of student's t distribution, exact for 1 and 2 degrees of freedom,
+    a Cornish-Fisher expansion around the normal quantile otherwise '''
+    if df == 1:
+        return math.tan(math.pi * (probability - 0.5))
+    if df == 2:
+        return (2 * probability - 1) * math.sqrt(2 / (4 * probability * (1 - probability)))
+    z = statistics.NormalDist().inv_cdf(probability)
+    return (z
+            + (z ** 3 + z) / (4 * df)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3))
+
+
+def confidence_interval(values, confidence=0.95):
+    ''' (mean, half width) of the confidence interval of the mean '''
+    values = [value for value in values if value is not None]
+    if not values:
+        return math.nan, math.nan
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, math.inf
+    half_width = (t_quantile((1 + confidence) / 2, len(values) - 1)
+                  * statistics.stdev(values) / math.sqrt(len(values)))
+    return mean, half_width
+
+
+def replicate(config, replications, hours, base_seed=1, delta_time=1.0, workers=None, confidence=0.95):
+    ''' run independent replications of the same configuration on a process pool
+    returns the per replication summaries, the confidence interval of each metric and the metrics of all
+    replications merged '''
+    seeds = replication_seeds(base_seed, replications)
+    workers = min(workers or os.cpu_count(), replications)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_replication, config, seed, hours, delta_time) for seed in seeds]
+        results = [future.result() for future in futures]
+
+    intervals = {metric: confidence_interval([result.get(metric) for result in results], confidence)
+                 for metric in METRICS}
+    pooled = JourneyMetrics.from_dict(results[0]["metrics"])
+    for result in results[1:]:
+        pooled.merge(JourneyMetrics.from_dict(result["metrics"]))
+    return results, intervals, pooled
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Independent replications of the elevator model")
+    add_model_arguments(parser)
+    parser.add_argument("--replications", type=int, default=8, help="number of independent runs")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, default one per core")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level of the intervals")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results, intervals, pooled = replicate(model_config(args), args.replications, args.hours,
+                                           base_seed=args.seed, delta_time=args.step, workers=args.workers,
+                                           confidence=args.confidence)
+    print(f"{len(results)} replications of {args.hours} h, {args.confidence:.0%} confidence intervals:")
+    for metric, (mean, half_width) in intervals.items():
+        print(f"{metric}: {mean:.1f} +- {half_width:.1f}")
+    print(f"all {pooled.served} riders served:")
+    for measure, values in pooled.summary().items():
+        print(f"{measure} time [s]: p50 {values['p50']:.1f}, p95 {values['p95']:.1f}, p99 {values['p99']:.1f}")
+
+
+if __name__ == '__main__':
+    main()
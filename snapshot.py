@@ -0,0 +1,151 @@
+import numpy
+
+ELEVATOR_FIELDS = ("floor", "state", "load", "car_riders")
+FLOOR_FIELDS = ("queue", "queue_riders")
+
+
+def frozen(values, dtype=numpy.int64):
+    array = numpy.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+class Frozen:
+    ''' attributes are set once, in __init__ '''
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _set(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __reduce__(self):
+        return restore, (type(self), {name: getattr(self, name) for name in self.__slots__})
+
+
+def restore(cls, fields):
+    ''' unpickle a Frozen, arrays come back read only '''
+    for value in fields.values():
+        for array in value if isinstance(value, tuple) else (value,):
+            if isinstance(array, numpy.ndarray):
+                array.flags.writeable = False
+    frozen_object = cls.__new__(cls)
+    frozen_object._set(**fields)
+    return frozen_object
+
+
+class Snapshot(Frozen):
+    ''' state of a model at one version. floor, state, load and queue are read only arrays, one entry per
+    elevator or floor. car_riders and queue_riders are tuples of read only arrays of rider ids, one per elevator
+    or floor, in the order of the model. the rider arrays of cars and queues that did not change are the very
+    arrays of the previous snapshot. time is when the model was first seen in this state '''
+
+    __slots__ = ("version", "time") + ELEVATOR_FIELDS + FLOOR_FIELDS
+
+    def __init__(self, version, time, floor, state, load, car_riders, queue, queue_riders):
+        self._set(version=version, time=time, floor=floor, state=state, load=load, car_riders=car_riders,
+                  queue=queue, queue_riders=queue_riders)
+
+
+class Delta(Frozen):
+    ''' what changed from version since to version: elevators and floors are the indices that changed, the other
+    fields their new values, as in Snapshot. since is None when the delta holds everything, see apply() '''
+
+    __slots__ = ("since", "version", "time", "elevators", "floors") + ELEVATOR_FIELDS + FLOOR_FIELDS
+
+    def __init__(self, since, base, snapshot):
+        if base is None:
+            elevators = numpy.arange(len(snapshot.floor))
+            floors = numpy.arange(len(snapshot.queue))
+        else:
+            elevators = numpy.flatnonzero((base.floor != snapshot.floor) | (base.state != snapshot.state)
+                                          | [mine is not theirs
+                                             for mine, theirs in zip(base.car_riders, snapshot.car_riders)])
+            floors = numpy.flatnonzero([mine is not theirs
+                                        for mine, theirs in zip(base.queue_riders, snapshot.queue_riders)])
+        self._set(since=since, version=snapshot.version, time=snapshot.time, elevators=frozen(elevators),
+                  floors=frozen(floors), floor=frozen(snapshot.floor[elevators], numpy.float64),
+                  state=frozen(snapshot.state[elevators], numpy.uint8),
+                  load=frozen(snapshot.load[elevators], numpy.int32),
+                  car_riders=tuple(snapshot.car_riders[idx] for idx in elevators),
+                  queue=frozen(snapshot.queue[floors], numpy.int32),
+                  queue_riders=tuple(snapshot.queue_riders[idx] for idx in floors))
+
+
+def apply(snapshot, delta):
+    ''' the snapshot at delta.version, from the snapshot at delta.since, or from nothing when since is None '''
+    if delta.since is not None and (snapshot is None or snapshot.version != delta.since):
+        raise ValueError(f"delta since version {delta.since} does not apply to this snapshot")
+    fields = {}
+    for indices, names in ((delta.elevators, ELEVATOR_FIELDS), (delta.floors, FLOOR_FIELDS)):
+        for name in names:
+            if delta.since is None:
+                fields[name] = getattr(delta, name)
+                continue
+            values = getattr(snapshot, name)
+            if isinstance(values, tuple):
+                values = list(values)
+                for idx, value in zip(indices, getattr(delta, name)):
+                    values[idx] = value
+                fields[name] = tuple(values)
+            else:
+                values = values.copy()
+                values[indices] = getattr(delta, name)
+                values.flags.writeable = False
+                fields[name] = values
+    return Snapshot(delta.version, delta.time, **fields)
+
+
+class Snapshots:
+    ''' takes snapshots of a model, see ElevatorModel.snapshot. the version only goes up when the state changed,
+    the last keep snapshots are kept to give deltas against. cars and queues count their changes, so only the
+    rider ids of the ones that changed are copied '''
+
+    def __init__(self, model, keep=64):
+        self.model = model
+        self.keep = keep
+        self.history = {}  # version -> Snapshot, oldest first
+        self.last = None
+        self._changes = None  # change counts of the cars and queues at the last snapshot
+
+    def take(self):
+        model = self.model
+        last = self.last
+        changes = ([load.changes for load in model.riders_in_elevator], [queue.changes for queue in model.queues])
+        floor = frozen([elevator.floor for elevator in model.elevators], numpy.float64)
+        state = frozen([elevator.state.value for elevator in model.elevators], numpy.uint8)
+        if last is not None and changes == self._changes and (floor == last.floor).all() \
+                and (state == last.state).all():
+            return last
+
+        if last is None:
+            car_riders = tuple(frozen([rider.id for rider in load]) for load in model.riders_in_elevator)
+            queue_riders = tuple(frozen([rider.id for rider in queue]) for queue in model.queues)
+        else:
+            car_changes, queue_changes = self._changes
+            car_riders = tuple(
+                riders if count == car_changes[idx] else frozen([rider.id for rider in load])
+                for idx, (riders, count, load) in enumerate(zip(last.car_riders, changes[0],
+                                                                model.riders_in_elevator)))
+            queue_riders = tuple(
+                riders if count == queue_changes[idx] else frozen([rider.id for rider in queue])
+                for idx, (riders, count, queue) in enumerate(zip(last.queue_riders, changes[1], model.queues)))
+        snapshot = Snapshot(0 if last is None else last.version + 1, model.time, floor, state,
+                            frozen([len(riders) for riders in car_riders], numpy.int32), car_riders,
+                            frozen([len(riders) for riders in queue_riders], numpy.int32), queue_riders)
+
+        self.last = snapshot
+        self._changes = changes
+        self.history[snapshot.version] = snapshot
+        if len(self.history) > self.keep:
+            del self.history[next(iter(self.history))]
+        return snapshot
+
+    def delta(self, since=None):
+        ''' changes from version since to now, everything when since is None or no longer kept '''
+        snapshot = self.take()
+        base = self.history.get(since)
+        return Delta(since if base is not None else None, base, snapshot)
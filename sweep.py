@@ -0,0 +1,182 @@
+import argparse
+import ast
+import csv
+import functools
+import hashlib
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from batch import add_model_arguments, model_config
+from replications import replication_seeds, run_replication
+
+
+def expand_grid(base, grid):
+    ''' one config per combination of the values in grid, on top of the base config '''
+    names = list(grid)
+    return [{**base, **dict(zip(names, values))} for values in itertools.product(*(grid[name] for name in names))]
+
+
+def local_modules(*roots):
+    ''' names of the modules next to this file that roots import, directly or through each other '''
+    directory = os.path.dirname(os.path.abspath(__file__))
+    found = set()
+    pending = list(roots)
+    while pending:
+        name = pending.pop()
+        path = os.path.join(directory, name + ".py")
+        if name in found or not os.path.exists(path):
+            continue
+        found.add(name)
+        with open(path, "rb") as source:
+            tree = ast.parse(source.read(), path)
+        for node in ast.walk(tree):  # imports inside functions too
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module)
+    return sorted(found)
+
+
+def code_version(roots=(run_replication.__module__,)):
+    ''' hash of the sources of every module the workers run, their changes invalidate cached results '''
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in local_modules(*roots):
+        with open(os.path.join(directory, name + ".py"), "rb") as source:
+            digest.update(name.encode())
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _file_digest(path, size, mtime):
+    digest = hashlib.sha256()
+    with open(path, "rb") as data:
+        for block in iter(lambda: data.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    ''' hash of the contents of path, only read again when its size or mtime changed '''
+    status = os.stat(path)
+    return _file_digest(os.path.abspath(path), status.st_size, status.st_mtime_ns)
+
+
+def cache_key(config, seed, hours, delta_time, version):
+    point = {"config": config, "seed": seed, "hours": hours, "delta_time": delta_time, "code": version}
+    if config.get("arrival_log"):
+        point["arrival_log_digest"] = file_digest(config["arrival_log"])  # the path alone says nothing of the riders
+    return hashlib.sha256(json.dumps(point, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    ''' on disk store of run summaries, one json file per key '''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as cached:
+                return json.load(cached)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, result):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as cached:
+            json.dump(result, cached)
+        os.replace(temp_path, path)  # readers never see a partial file
+
+
+def sweep(configs, seeds, hours, cache_dir=".sweep_cache", delta_time=1.0, workers=None):
+    ''' run every config with every seed, computing only the points missing from the cache
+    returns one (config, seed, summary) row per point, in order '''
+    cache = ResultCache(cache_dir)
+    version = code_version()
+    points = [(config, seed) for config in configs for seed in seeds]
+    keys = [cache_key(config, seed, hours, delta_time, version) for config, seed in points]
+    results = [cache.get(key) for key in keys]
+
+    missing = [idx for idx, result in enumerate(results) if result is None]
+    if missing:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_replication, *points[idx], hours, delta_time): idx for idx in missing}
+            for future in as_completed(futures):
+                idx = futures[future]
+                results[idx] = future.result()
+                cache.put(keys[idx], results[idx])
+
+    return [(config, seed, result) for (config, seed), result in zip(points, results)], len(missing)
+
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def parse_grid(params):
+    ''' ["num_floors=5,10", "controller=fifo"] -> {"num_floors": [5, 10], "controller": ["fifo"]} '''
+    grid = {}
+    for param in params:
+        name, values = param.split("=", 1)
+        grid[name] = [parse_value(value) for value in values.split(",")]
+    return grid
+
+
+def write_rows(rows, out):
+    # nested results, like the mergeable metrics, stay in the cache only
+    rows = [{**config, **{name: value for name, value in result.items() if not isinstance(value, dict)}}
+            for config, _, result in rows]
+    columns = list(dict.fromkeys(column for row in rows for column in row))
+    writer = csv.DictWriter(out, fieldnames=columns)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep of the elevator model with a result cache")
+    add_model_arguments(parser)
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2",
+                        help="make_model argument to sweep, may be repeated, e.g. num_floors=5,10,20")
+    parser.add_argument("--grid", help="json file of {make_model argument: [values]} to sweep")
+    parser.add_argument("--replications", type=int, default=1, help="seeds per configuration")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, default one per core")
+    parser.add_argument("--cache", default=".sweep_cache", help="result cache directory")
+    parser.add_argument("--out", help="csv file for the results, default stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    grid = {}
+    if args.grid:
+        with open(args.grid) as grid_file:
+            grid.update(json.load(grid_file))
+    grid.update(parse_grid(args.param))
+
+    configs = expand_grid(model_config(args), grid)
+    seeds = replication_seeds(args.seed, args.replications)
+    rows, computed = sweep(configs, seeds, args.hours, args.cache, args.step, args.workers)
+    print(f"{len(rows)} points, {computed} computed, {len(rows) - computed} from cache", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, "w", newline="") as out:
+            write_rows(rows, out)
+    else:
+        write_rows(rows, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
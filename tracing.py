@@ -0,0 +1,135 @@
+import numpy
+
+# event kinds
+SPAWN = 0  # rider appears, floor = origin, value = destination
+CALL = 1  # new hall call, value = Direction value
+ASSIGN = 2  # call or rider given to an elevator, value = Direction value
+DEPART = 3  # elevator leaves floor, value = goal
+ARRIVE = 4  # elevator stops at its goal floor
+DOOR = 5  # value = 1 when the doors open, 0 when they close
+BOARD = 6
+ALIGHT = 7
+KIND_NAMES = ("spawn", "call", "assign", "depart", "arrive", "door", "board", "alight")
+
+# levels, as in logging
+DEBUG = 10
+INFO = 20
+
+# every kind has one level and one category
+KIND_LEVELS = (DEBUG, INFO, INFO, INFO, INFO, DEBUG, DEBUG, DEBUG)
+KIND_CATEGORIES = ("rider", "dispatch", "dispatch", "motion", "motion", "door", "rider", "rider")
+CATEGORIES = ("rider", "dispatch", "motion", "door")
+
+EVENT_DTYPE = numpy.dtype([
+    ("time", numpy.float64),
+    ("kind", numpy.uint8),
+    ("elevator", numpy.int16),  # -1 when none
+    ("floor", numpy.int16),
+    ("rider", numpy.int64),  # -1 when none
+    ("value", numpy.float64),
+])
+
+
+class Tracer:
+    ''' typed simulation events recorded into a preallocated ring buffer of EVENT_DTYPE records.
+    events below level, or outside categories, are not recorded. when the buffer is full it is drained to the
+    sinks in one go, without sinks the oldest events are overwritten. the model only calls emit() when it has
+    a tracer, tracing off costs one comparison per call site '''
+
+    def __init__(self, capacity=65536, level=INFO, categories=None, sinks=()):
+        self.buffer = numpy.zeros(capacity, dtype=EVENT_DTYPE)
+        self.capacity = capacity
+        self.sinks = list(sinks)
+        self.clock = lambda: 0.0  # set by the model
+        self.next = 0  # slot of the next event
+        self.size = 0  # events in the buffer
+        self.overwritten = 0
+        self.emitted = 0
+        self.set_filter(level, categories)
+
+    def set_filter(self, level=INFO, categories=None):
+        categories = CATEGORIES if categories is None else categories
+        self.wants = [KIND_LEVELS[kind] >= level and KIND_CATEGORIES[kind] in categories
+                      for kind in range(len(KIND_NAMES))]
+
+    def emit(self, kind, elevator=-1, floor=-1, rider=-1, value=0.0):
+        if not self.wants[kind]:
+            return
+        if self.size == self.capacity:
+            if self.sinks:
+                self.flush()
+            else:
+                self.overwritten += 1
+                self.size -= 1
+        self.buffer[self.next] = (self.clock(), kind, elevator, floor, rider, value)
+        self.next = (self.next + 1) % self.capacity
+        self.size += 1
+        self.emitted += 1
+
+    def events(self):
+        ''' copy of the buffered events, oldest first '''
+        start = (self.next - self.size) % self.capacity
+        if start + self.size <= self.capacity:
+            return self.buffer[start:start + self.size].copy()
+        return numpy.concatenate((self.buffer[start:], self.buffer[:self.next]))
+
+    def flush(self):
+        ''' hand the buffered events to every sink and empty the buffer '''
+        if self.size:
+            events = self.events()
+            for sink in self.sinks:
+                sink.write(events)
+        self.size = 0
+
+    def close(self):
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+
+class CallbackSink:
+    ''' calls callback with each drained array of events '''
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, events):
+        self.callback(events)
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    ''' appends drained events to a file, as raw EVENT_DTYPE records (see read_trace) or as text lines '''
+
+    def __init__(self, path, binary=True):
+        self.binary = binary
+        self.file = open(path, "wb" if binary else "w")
+
+    def write(self, events):
+        if self.binary:
+            events.tofile(self.file)
+        else:
+            self.file.writelines(format_event(event) + "\n" for event in events)
+
+    def close(self):
+        self.file.close()
+
+
+def format_event(event):
+    text = f"{event['time']:.3f} {KIND_NAMES[event['kind']]}"
+    if event["elevator"] >= 0:
+        text += f" elevator={event['elevator']}"
+    if event["floor"] >= 0:
+        text += f" floor={event['floor']}"
+    if event["rider"] >= 0:
+        text += f" rider={event['rider']}"
+    if event["kind"] in (SPAWN, CALL, ASSIGN, DEPART, DOOR):
+        text += f" value={event['value']:g}"
+    return text
+
+
+def read_trace(path):
+    ''' events of a binary trace file '''
+    return numpy.fromfile(path, dtype=EVENT_DTYPE)
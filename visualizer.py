@@ -1,3 +1,5 @@
+import itertools
+
 import pygame
 pygame.font.get_fonts()
 from enum import Enum
@@ -22,100 +24,135 @@ class Color(Enum):
 
 
 class ElevatorRenderer:
+    ''' draws model states into the window, or off screen into a plain Surface of size when headless is set,
+    see export.py. sizes of riders and signs follow the height, as they are at 600 pixels '''
 
-    def __init__(self, model):
+    def __init__(self, model, size=(600, 600), headless=False):
         # taken from the model
         self.num_floors = model.num_floors  # 0 + number of floors above ground
         self.num_elevators = model.num_elevators
 
         # graphics constants
-        self.width = 600
-        self.height = 600
+        self.width, self.height = size
+        scale = self.height / 600
         self.margin = 10
         self.floor_height = (self.height - 2 * self.margin) // self.num_floors
         self.elevator_height = int(self.floor_height * 0.75)
         self.elevator_spacing = (self.width - 2 * self.margin) // (self.num_elevators + 1)
         self.elevator_width = int(self.elevator_spacing * 0.85)
         self.sign_height_in_floor = 0.75  # of the floor
-        self.rider_radius = 20
+        self.rider_radius = max(round(20 * scale), 1)
 
         self.chute_x = []
         for elevator_id in range(self.num_elevators):
             self.chute_x.append(self.margin + self.elevator_spacing * (elevator_id + 1))
 
-        self.window = pygame.display.set_mode((self.width, self.height))
-        pygame.display.set_caption("Multiple Elevator System Sim")
-        self.sign_font = pygame.font.SysFont('comicsansms', 30)
+        self.headless = headless
+        if headless:
+            pygame.font.init()
+            self.window = pygame.Surface((self.width, self.height))
+        else:
+            self.window = pygame.display.set_mode((self.width, self.height))
+            pygame.display.set_caption("Multiple Elevator System Sim")
+        self.sign_font = pygame.font.SysFont('comicsansms', max(round(30 * scale), 1))
         #self.queue_font = pygame.font.SysFont('comicsansms', 20)
 
-    def draw_building(self, model_state):
+        # rider colors by id, cars leave out the last two, the building and elevator colors
+        self.queue_palette = [color.value for color in Color]
+        self.car_palette = self.queue_palette[:-2]
+        # riders of a queue that fit left of the first chute, the others are not drawn
+        self.queue_shown = -(-self.chute_x[0] // (2 * self.rider_radius))
+
+        self.background = self.draw_background()
+        self.drawn = {}  # ("elevator", id) or ("queue", floor) -> (what was drawn, rect it covers)
+
+    def draw_background(self):
+        ''' the building, floor signs and chutes, drawn once on a surface of the window size '''
+        background = pygame.Surface(self.window.get_size())
+        if not self.headless:
+            background = background.convert()
         # building outline
-        self.window.fill(Color.BLACK.value)
-        pygame.draw.rect(self.window, Color.GRAY.value, (self.margin, self.margin, self.width, self.height))
+        background.fill(Color.BLACK.value)
+        pygame.draw.rect(background, Color.GRAY.value, (self.margin, self.margin, self.width, self.height))
 
         # floor lines
         for floor in range(self.num_floors):
-            pygame.draw.line(self.window, Color.BLACK.value,
+            pygame.draw.line(background, Color.BLACK.value,
                              (self.margin, (self.height - self.margin - self.floor_height * floor)),
                              (self.margin + self.width, (self.height - self.margin - self.floor_height * floor)), 2)
 
             floor_sign = self.sign_font.render(f"Floor {str(floor)}", 1, Color.BLACK.value)
             floor_sign_y = self.height - self.margin - int(self.floor_height * (floor + self.sign_height_in_floor))
-            self.window.blit(floor_sign,
-                             (self.margin, floor_sign_y))
-            '''
-            queue_sign = QUEUE_FONT.render(f"{len(self.riders.queues[floor])} in queue", 1, Color.BLACK.value)
-            self.window.blit(queue_sign, (self.x + SIGN_SPACE_FROM_LEFT,
-                                  self.floors_y[floor] - int(FLOORS_DIFF_Y * QUEUE_SIGN_DISTANCE_FROM_FLOOR))) '''
+            background.blit(floor_sign,
+                            (self.margin, floor_sign_y))
         # elevators chutes
         for elevator_id in range(self.num_elevators):
-            # elevator_y = self.height - self.margin - self.floor_height * floor - self.elevator_height
-            pygame.draw.line(self.window, Color.BLUE.value,
+            pygame.draw.line(background, Color.BLUE.value,
                              (self.chute_x[elevator_id], self.height - self.margin),
                              (self.chute_x[elevator_id], self.margin), 2)
-            # elevator_sign = SIGN_FONT.render(f"Elevator {str(elevator)}", 1, Color.BLUE.value)
-            # self.window.blit(elevator_sign, (elevator_x - 55, self.y - 40))
-
-        '''
-        self.riders.draw([elevator.y for elevator in self.elevators])'''
-
-    def draw_elevators(self, model_state):
-        for elevator in range(self.num_elevators):
-
-            # draw the elevator
-            elevator_y = (self.height - self.margin
-                          - self.floor_height * model_state["elevators_position"][elevator] - self.elevator_height)
-            pygame.draw.rect(self.window, Color.BLUE.value, (self.chute_x[elevator], elevator_y,
-                                                             self.elevator_width, self.elevator_height))
-
-            # draw the riders
-            for idx, rider in enumerate(model_state["riders_in_elevator"][elevator]):
-                rider_x = self.chute_x[elevator] + (2 * idx + 1) * self.rider_radius
-                rider_y = self.height - self.margin - self.floor_height * model_state["elevators_position"][elevator] - self.rider_radius
-                # color is derived from rider ID
-                rider_color = list(Color)[rider.id % (len(Color) - 2)].value  # excluding background and elevator color
-                pygame.draw.circle(self.window, rider_color, (rider_x, rider_y), self.rider_radius)
-            #queue_length = len(model_state["riders_in_elevator"][elevator])
-            #queue_sign = self.sign_font.render(f"{queue_length} in queue", 1, Color.BLACK.value)
-            #self.window.blit(queue_sign, (0, 0))
-
-    def draw_queues(self, model_state):
-        for floor in range(self.num_floors):
-            for idx, rider in enumerate(model_state["queues"][floor]):
-                rider_x = self.chute_x[0] - (2 * idx + 1) * self.rider_radius
-                rider_y = self.height - self.margin - self.floor_height * floor - self.rider_radius
-                # color is derived from rider ID
-                rider_color = list(Color)[rider.id % len(Color)].value
-                pygame.draw.circle(self.window, rider_color, (rider_x, rider_y), self.rider_radius)
-
-    def render(self, model_state):
-        self.draw_building(model_state)
-        self.draw_elevators(model_state)
-        self.draw_queues(model_state)
-
+        return background
 
+    def draw_building(self, model_state):
+        self.window.blit(self.background, (0, 0))
+
+    def draw_elevator(self, elevator, position, riders):
+        ''' the car and its riders, returns the rect they cover '''
+        elevator_y = self.height - self.margin - self.floor_height * position - self.elevator_height
+        rect = pygame.draw.rect(self.window, Color.BLUE.value, (self.chute_x[elevator], elevator_y,
+                                                                self.elevator_width, self.elevator_height))
+        rider_y = self.height - self.margin - self.floor_height * position - self.rider_radius
+        for idx, rider in enumerate(riders):
+            rider_x = self.chute_x[elevator] + (2 * idx + 1) * self.rider_radius
+            # color is derived from rider ID
+            rider_color = self.car_palette[rider.id % len(self.car_palette)]
+            rect.union_ip(pygame.draw.circle(self.window, rider_color, (rider_x, rider_y), self.rider_radius))
+        return rect
+
+    def draw_queue(self, floor, riders):
+        ''' the waiting riders of a floor, returns the rect they cover '''
+        rider_y = self.height - self.margin - self.floor_height * floor - self.rider_radius
+        rect = pygame.Rect(self.chute_x[0], rider_y, 0, 0)
+        for idx, rider in enumerate(riders):
+            rider_x = self.chute_x[0] - (2 * idx + 1) * self.rider_radius
+            # color is derived from rider ID
+            rider_color = self.queue_palette[rider.id % len(self.queue_palette)]
+            rect.union_ip(pygame.draw.circle(self.window, rider_color, (rider_x, rider_y), self.rider_radius))
+        return rect
 
-        pygame.display.flip()
+    def render(self, model_state):
+        ''' redraws the cars and queues that changed since the last frame over the cached background, and
+        updates only their rects on the display '''
+        items = {}  # key -> (what to draw, draw arguments), in drawing order
+        for elevator, (position, riders) in enumerate(zip(model_state["elevators_position"],
+                                                          model_state["riders_in_elevator"])):
+            items["elevator", elevator] = ((position, tuple(rider.id for rider in riders)),
+                                           (self.draw_elevator, elevator, position, riders))
+        for floor, queue in enumerate(model_state["queues"]):
+            riders = list(itertools.islice(queue, self.queue_shown))
+            items["queue", floor] = (tuple(rider.id for rider in riders), (self.draw_queue, floor, riders))
+
+        first_frame = not self.drawn
+        if first_frame:
+            self.draw_building(model_state)
+            changed = set(items)
+        else:
+            changed = {key for key, (content, _) in items.items() if self.drawn[key][0] != content}
+        # erase what changed, then draw in order what changed and what overlaps anything erased or drawn
+        dirty = [self.drawn[key][1] for key in changed if key in self.drawn]
+        for rect in dirty:
+            self.window.blit(self.background, rect, rect)
+        for key, (content, (draw, *args)) in items.items():
+            if key in changed or self.drawn[key][1].collidelist(dirty) >= 0:
+                rect = draw(*args)
+                self.drawn[key] = (content, rect)
+                dirty.append(rect)
+
+        if self.headless:
+            return
+        if first_frame:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
 
 
 if __name__ == '__main__':